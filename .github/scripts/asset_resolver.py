@@ -0,0 +1,101 @@
+# asset_resolver.py
+
+import os
+
+# Картинки моделей по цветам: public/img/models/{folder}/colors/{color_image}
+MODELS_DIR = 'public/img/models'
+MODELS_URL = '/img/models'
+
+
+def normalize_color(color):
+    """
+    Normalizes a color name for lookups: case, 'ё', extra spaces and
+    repeated parts like 'Черный/черный' collapse to one key.
+    """
+    if not color:
+        return ''
+    parts = [part.strip().lower().replace('ё', 'е') for part in color.split('/')]
+    parts = [part for part in parts if part]
+    if parts and all(part == parts[0] for part in parts):
+        return parts[0]
+    return '/'.join(parts)
+
+
+class ColorResolver:
+    """
+    Resolves model/color pairs to swatch images in O(1).
+
+    The colors folders are scanned once, every model_mapping entry is
+    checked against the scan, and misses are counted per model/color so
+    each one is reported once with the number of affected VINs.
+    """
+
+    def __init__(self, model_mapping, models_dir=MODELS_DIR):
+        self.models_dir = models_dir
+        self.scanned = os.path.isdir(models_dir)
+        self.files = self.scan() if self.scanned else {}
+        self.colors = {}
+        self.broken = []
+        self.missing = {}
+
+        for model, model_info in model_mapping.items():
+            folder = model_info.get('folder')
+            colors = {}
+            for color, color_image in model_info.get('color', {}).items():
+                path = self.find_file(folder, color_image)
+                if path is None:
+                    self.broken.append((model, color, f"{folder}/colors/{color_image}"))
+                    continue
+                colors.setdefault(normalize_color(color), path)
+            self.colors[model.strip()] = colors
+
+    def scan(self):
+        """Indexes {folder: {file name and file stem: file name}} for all colors folders."""
+        files = {}
+        for folder in os.listdir(self.models_dir):
+            colors_dir = os.path.join(self.models_dir, folder, 'colors')
+            if not os.path.isdir(colors_dir):
+                continue
+            names = {}
+            for name in sorted(os.listdir(colors_dir)):
+                names.setdefault(os.path.splitext(name)[0], name)
+                names[name] = name
+            files[folder] = names
+        return files
+
+    def find_file(self, folder, color_image):
+        if not self.scanned:
+            # Папки с картинками нет (например, локальный запуск) — доверяем model_mapping
+            return f"{MODELS_URL}/{folder}/colors/{color_image}"
+        name = self.files.get(folder, {}).get(color_image)
+        return f"{MODELS_URL}/{folder}/colors/{name}" if name else None
+
+    def resolve(self, model, color):
+        """Returns the swatch image URL for a model and color, or None."""
+        return self.colors.get((model or '').strip(), {}).get(normalize_color(color))
+
+    def note_car(self, car):
+        """Counts the car if its model/color has no image."""
+        model = (car.findtext('folder_id') or '').strip()
+        color = (car.findtext('color') or '').strip().capitalize()
+        if self.resolve(model, color) is None:
+            key = (model, color)
+            self.missing[key] = self.missing.get(key, 0) + 1
+
+    def report(self, output_path='output.txt'):
+        """
+        Writes config entries without files and missing model/colors, each once.
+
+        Returns:
+            bool: True if any car is left without a model/color image.
+        """
+        lines = [f"Нет файла для {model} / {color}: {path}" for model, color, path in self.broken]
+        lines += [
+            f"Не хватает модели: {model} или цвета: {color} (VIN: {count})"
+            for (model, color), count in sorted(self.missing.items())
+        ]
+        if lines:
+            print("\n".join(lines))
+            with open(output_path, 'a') as file:
+                file.write("\n".join(lines) + "\n")
+        return bool(self.missing)
@@ -0,0 +1,176 @@
+# python3 .github/scripts/bench.py --cars 100 --runs 5 --output bench.json
+#
+# Замеряет update_cars.py по этапам без сети: фид и фотографии синтетические,
+# фото раздает локальный HTTP-сервер. Каждый прогон — в чистой временной папке
+# сайта; с --warm кэш (HTTP, размеры, хэши) общий, а первый прогон его прогревает
+# и в статистику не идет. Итог — медиана, среднее, разброс по каждому этапу.
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from xml.sax.saxutils import escape
+from PIL import Image, ImageDraw
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+METRICS = ('wall', 'cpu', 'memory', 'files')
+
+# Цвета и модели фида: часть есть в model_mapping, часть нет — как в жизни
+FEED_MODELS = ("Atlas Pro", "Coolray, I", "Monjaro", "Tugella, I Рестайлинг", "Emgrand", "Нет такой")
+FEED_COLORS = ("Черный", "Белый", "Серый", "Красный", "Черный/черный", "Синий")
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def make_images(directory, count, seed):
+    """Writes `count` distinct 800x600 JPEG photos and returns their file names."""
+    rng = random.Random(seed)
+    names = []
+    for number in range(count):
+        image = Image.new('RGB', (800, 600), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rng.randrange(800), rng.randrange(600)
+            draw.rectangle((x, y, x + rng.randrange(50, 400), y + rng.randrange(50, 300)), fill=tuple(rng.randrange(256) for _ in range(3)))
+        name = f"photo-{number}.jpg"
+        image.save(os.path.join(directory, name), 'JPEG', quality=85)
+        names.append(name)
+    return names
+
+
+def make_feed(path, cars, image_urls, seed):
+    """Writes a synthetic feed in the update_cars.py format."""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n<data><cars>\n")
+        for number in range(cars):
+            photos = rng.sample(image_urls, min(len(image_urls), rng.randint(3, 8)))
+            f.write(
+                "<car>"
+                "<mark_id>Geely</mark_id>"
+                f"<folder_id>{escape(FEED_MODELS[number % len(FEED_MODELS)])}</folder_id>"
+                "<modification_id>1.5 AMT (150 л.с.)</modification_id>"
+                f"<complectation_name>Комплектация {number % 7}</complectation_name>"
+                f"<color>{escape(FEED_COLORS[rng.randrange(len(FEED_COLORS))])}</color>"
+                f"<year>{2022 + number % 3}</year>"
+                f"<run>{rng.choice((0, 0, 0, 15000))}</run>"
+                f"<price>{2000000 + rng.randrange(100) * 10000}</price>"
+                f"<max_discount>{rng.randrange(6) * 10000}</max_discount>"
+                f"<vin>XTA{number:014d}</vin>"
+                "<availability>в наличии</availability>"
+                f"<total>{rng.randint(1, 3)}</total>"
+                f"<description>{escape('Автомобиль в наличии. ' * rng.randint(1, 20))}</description>"
+                "<extras>ABS\nESP\nКруиз-контроль</extras>"
+                "<images>" + "".join(f"<image>{url}</image>" for url in photos) + "</images>"
+                "</car>\n"
+            )
+        f.write("</cars></data>\n")
+
+
+def run_once(script, feed_path, cache_dir, log_path):
+    """Runs the script in a fresh site folder and returns its stage report."""
+    site_dir = tempfile.mkdtemp(prefix='bench-site-')
+    report_path = os.path.join(site_dir, 'stages.json')
+    try:
+        os.makedirs(os.path.join(site_dir, 'public'))
+        env = dict(os.environ, XML_FILE=feed_path, CACHE_DIR=cache_dir, STAGES_REPORT=report_path, REPO_NAME='bench.local')
+        env.pop('THUMBS_CACHE_DIR', None)
+        with open(log_path, 'w') as log:
+            result = subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, script)], cwd=site_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        if result.returncode != 0 or not os.path.exists(report_path):
+            with open(log_path, 'r') as log:
+                print(log.read()[-3000:])
+            raise RuntimeError(f"{script} завершился с кодом {result.returncode}, лог: {log_path}")
+        with open(report_path, 'r', encoding='utf-8') as f:
+            return json.load(f)['stages']
+    finally:
+        shutil.rmtree(site_dir, ignore_errors=True)
+
+
+def summarize(values):
+    return {
+        'median': statistics.median(values),
+        'mean': statistics.mean(values),
+        'stdev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        'min': min(values),
+        'max': max(values),
+        'runs': values,
+    }
+
+
+def aggregate(runs):
+    """Per-stage, per-metric statistics over several stage reports."""
+    names = []
+    for stages in runs:
+        names += [stage['name'] for stage in stages if stage['name'] not in names]
+
+    result = {}
+    for name in names:
+        measured = [next(stage for stage in stages if stage['name'] == name) for stages in runs if any(stage['name'] == name for stage in stages)]
+        result[name] = {metric: summarize([stage[metric] for stage in measured]) for metric in METRICS}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the page generator offline on a synthetic feed.')
+    parser.add_argument('--cars', type=int, default=100, help='Cars in the synthetic feed')
+    parser.add_argument('--photos', type=int, default=40, help='Distinct synthetic photos')
+    parser.add_argument('--runs', type=int, default=5, help='Measured runs')
+    parser.add_argument('--warm', action='store_true', help='Share the cache between runs (after one unmeasured warm-up run)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the feed and the photos')
+    parser.add_argument('--script', default='update_cars.py', help='Generator script in .github/scripts')
+    parser.add_argument('--output', default='bench.json', help='Where to write the results')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench-')
+    server = None
+    try:
+        photos_dir = os.path.join(work_dir, 'photos')
+        os.makedirs(photos_dir)
+        names = make_images(photos_dir, args.photos, args.seed)
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=photos_dir))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        feed_path = os.path.join(work_dir, 'cars.xml')
+        make_feed(feed_path, args.cars, [f"{base_url}/{name}" for name in names], args.seed)
+
+        shared_cache = os.path.join(work_dir, 'cache')
+        if args.warm:
+            run_once(args.script, feed_path, shared_cache, os.path.join(work_dir, 'warmup.log'))
+
+        runs = []
+        for number in range(args.runs):
+            cache_dir = shared_cache if args.warm else os.path.join(work_dir, f"cache-{number}")
+            stages = run_once(args.script, feed_path, cache_dir, os.path.join(work_dir, f"run-{number}.log"))
+            total = next(stage for stage in stages if stage['name'] == 'total')
+            print(f"Прогон {number + 1}/{args.runs}: {total['wall']:.2f} с, {total['memory'] // 1024} МБ, файлов {total['files']}")
+            runs.append(stages)
+
+        results = {
+            'meta': {'script': args.script, 'cars': args.cars, 'photos': args.photos, 'runs': args.runs, 'warm': args.warm, 'seed': args.seed},
+            'stages': aggregate(runs),
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты: {args.output}")
+    finally:
+        if server:
+            server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
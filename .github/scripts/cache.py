@@ -0,0 +1,44 @@
+# cache.py
+
+import os
+import json
+
+# Папка для кэшей между запусками (в CI сохраняется через actions/cache)
+CACHE_DIR = os.getenv('CACHE_DIR', '.cache')
+
+
+def cache_path(name):
+    """Returns the path of a cache file, creating the cache folder if needed."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
+
+
+def load_json_cache(name):
+    """
+    Loads a JSON cache from the cache folder.
+
+    Args:
+        name (str): The cache file name.
+
+    Returns:
+        dict: The cached data, or an empty dict if the cache is missing or broken.
+    """
+    path = cache_path(name)
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Кэш {path} не прочитан, начинаем с пустого: {e}")
+        return {}
+
+
+def save_json_cache(name, data):
+    """Atomically saves a JSON cache to the cache folder."""
+    path = cache_path(name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
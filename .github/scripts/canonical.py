@@ -0,0 +1,75 @@
+# canonical.py
+
+import os
+import yaml
+
+# CANONICAL_OUTPUT=1 — одинаковый склад дает побайтово одинаковые страницы и выгрузки
+CANONICAL_OUTPUT = os.getenv('CANONICAL_OUTPUT', '0') == '1'
+
+
+class CanonicalDumper(yaml.SafeDumper):
+    """SafeDumper that writes multiline strings as '|' blocks."""
+
+
+def represent_str(dumper, value):
+    style = '|' if '\n' in value else None
+    return dumper.represent_scalar('tag:yaml.org,2002:str', value, style=style)
+
+
+CanonicalDumper.add_representer(str, represent_str)
+
+
+def dump_frontmatter(data):
+    """
+    Dumps frontmatter data with sorted keys and block lists.
+
+    Args:
+        data (dict): The parsed frontmatter.
+
+    Returns:
+        str: The YAML block.
+    """
+    return yaml.dump(data, Dumper=CanonicalDumper, sort_keys=True, default_flow_style=False, allow_unicode=True)
+
+
+def canonicalize_page(content):
+    """
+    Rewrites the frontmatter of a page in the canonical form, so a page looks
+    the same whether it was created from one car or merged from several.
+
+    Args:
+        content (str): The page text: '---', YAML, '---', body.
+
+    Returns:
+        str: The page with the canonical frontmatter and the body untouched.
+    """
+    yaml_delimiter = "---\n"
+    parts = content.split(yaml_delimiter)
+    if len(parts) < 3:
+        return content
+    try:
+        data = yaml.safe_load(parts[1])
+    except yaml.YAMLError as e:
+        # Страница остается как есть, Astro покажет ту же ошибку, что и раньше
+        print(f"Не удалось разобрать frontmatter: {e}")
+        return content
+    return yaml_delimiter.join([parts[0], dump_frontmatter(data), yaml_delimiter.join(parts[2:])])
+
+
+def car_sort_key(car):
+    return (car.findtext('vin') or '', car.findtext('id') or '')
+
+
+def sort_cars(cars_element, key=car_sort_key):
+    """
+    Orders the cars of a feed by a stable key, in place.
+
+    The whitespace between elements stays where it was, so the exported
+    XML does not change when only the feed order did.
+    """
+    cars = list(cars_element)
+    tails = [car.tail for car in cars]
+    cars.sort(key=key)
+    for car, tail in zip(cars, tails):
+        car.tail = tail
+    cars_element[:] = cars
@@ -0,0 +1,195 @@
+# checkpoint.py
+
+import os
+import json
+import shutil
+
+# Страницы пишутся сюда и подменяют src/content/cars только в конце запуска
+STAGING_DIR = '.staging'
+
+
+class Checkpoint:
+    """
+    Journal of completed units of work for a resumable run.
+
+    Pages are rendered into a staging folder, and every processed car is
+    appended to a JSONL journal together with the thumbnails it produced.
+    If the run dies, the next run with the same feed skips the journaled
+    cars and continues in the same staging folder.
+    """
+
+    def __init__(self, feed_hash, name='cars', staging_dir=STAGING_DIR):
+        self.feed_hash = feed_hash
+        self.directory = os.path.join(staging_dir, name)
+        self.journal_path = os.path.join(staging_dir, f"{name}.jsonl")
+        self.units = {}
+
+        if self.load():
+            print(f"Продолжаем прерванный запуск: готово машин — {len(self.units)}")
+        else:
+            self.reset()
+
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def load(self):
+        """Reads the journal. Returns False if there is nothing to resume for this feed."""
+        if not os.path.exists(self.journal_path) or not os.path.isdir(self.directory):
+            return False
+
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+        if not lines or json.loads(lines[0]).get('feed') != self.feed_hash:
+            return False
+
+        shards = []
+        for line in lines[1:]:
+            try:
+                unit = json.loads(line)
+            except ValueError:
+                # Последняя строка могла не дописаться при падении
+                break
+            if 'shard' in unit:
+                shards.append(unit['shard'])
+                for shard_unit in unit['units']:
+                    self.units[shard_unit['unit']] = shard_unit
+            else:
+                self.units[unit['unit']] = unit
+
+        # Шард попал в журнал, но его страницы могли не успеть переехать в staging
+        for shard in shards:
+            self.adopt(shard)
+
+        # Превью прерванного запуска могли не сохраниться (например, на новом раннере): страницы ссылались бы на пустоту
+        missing = [thumb for unit in self.units.values() for thumb in unit['thumbs'] if not os.path.exists(thumb)]
+        if missing:
+            print(f"Нет превью из журнала: {len(missing)} (например, {missing[0]}), запуск начинается заново")
+            self.units = {}
+            return False
+        return True
+
+    def reset(self):
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+        with open(self.journal_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'feed': self.feed_hash}) + "\n")
+
+    @property
+    def resumed(self):
+        return bool(self.units)
+
+    def done(self, index):
+        return index in self.units
+
+    def discard_partial(self, unique_ids):
+        """
+        Forgets the staged pages that have cars missing from the journal.
+
+        A car's page is on disk before its journal line is written. If the run
+        died in between, the staged page already has the car, and rendering it
+        again would merge it into the page twice. Such pages are deleted, and
+        all of their cars, journaled or not, are rendered again.
+
+        Args:
+            unique_ids (list): The page slug of every car, in feed order.
+
+        The run died after writing the page of car 1 but before journaling it:
+
+        >>> import tempfile
+        >>> staging_dir = tempfile.mkdtemp()
+        >>> checkpoint = Checkpoint('feed', staging_dir=staging_dir)
+        >>> checkpoint.record(0, 'atlas', [], False)
+        >>> with open(os.path.join(checkpoint.directory, 'atlas.mdx'), 'w') as f:
+        ...     _ = f.write('total: 2')
+        >>> checkpoint.journal.close()
+        >>> resumed = Checkpoint('feed', staging_dir=staging_dir)
+        Продолжаем прерванный запуск: готово машин — 1
+        >>> resumed.discard_partial(['atlas', 'atlas', 'coolray'])
+        Страницы с машинами не из журнала собираются заново: 1 (машин из журнала на них: 1)
+        >>> resumed.done(0), os.path.exists(os.path.join(resumed.directory, 'atlas.mdx'))
+        (False, False)
+        >>> resumed.journal.close(); shutil.rmtree(staging_dir)
+        """
+        pending = {unique_id for index, unique_id in enumerate(unique_ids) if index not in self.units}
+        stale = [index for index, unit in self.units.items() if unit['unique_id'] in pending]
+        pages = [
+            os.path.join(self.directory, f"{unique_id}.mdx") for unique_id in sorted(pending)
+            if os.path.exists(os.path.join(self.directory, f"{unique_id}.mdx"))
+        ]
+        if not stale and not pages:
+            return
+
+        for index in stale:
+            del self.units[index]
+        for page in pages:
+            os.remove(page)
+        print(f"Страницы с машинами не из журнала собираются заново: {len(pages)} (машин из журнала на них: {len(stale)})")
+
+    def record(self, index, unique_id, thumbs, error_404):
+        """Journals a processed car with the thumbnails it added."""
+        unit = {'unit': index, 'unique_id': unique_id, 'thumbs': thumbs, 'error_404': error_404}
+        self.units[index] = unit
+        self.journal.write(json.dumps(unit, ensure_ascii=False) + "\n")
+        self.journal.flush()
+
+    def record_shard(self, units, directory):
+        """
+        Journals the cars of a shard rendered into `directory` in a single line.
+
+        The line is written before the pages are moved into staging; a resumed
+        run finishes the move, so staging never has pages of unjournaled cars.
+
+        Args:
+            units (list): (index, unique_id, thumbs, error_404) tuples.
+            directory (str): The shard folder with the rendered pages.
+        """
+        entries = [
+            {'unit': index, 'unique_id': unique_id, 'thumbs': thumbs, 'error_404': error_404}
+            for index, unique_id, thumbs, error_404 in units
+        ]
+        for entry in entries:
+            self.units[entry['unit']] = entry
+        self.journal.write(json.dumps({'shard': directory, 'units': entries}, ensure_ascii=False) + "\n")
+        self.journal.flush()
+
+    def adopt(self, directory):
+        """Moves the pages of a journaled shard into staging. Returns the page names."""
+        if not os.path.isdir(directory):
+            return []
+        pages = sorted(os.listdir(directory))
+        for file_name in pages:
+            os.replace(os.path.join(directory, file_name), os.path.join(self.directory, file_name))
+        shutil.rmtree(directory)
+        return pages
+
+    def commit(self, target):
+        """Swaps the staging folder in place of `target` and drops the journal."""
+        self.journal.close()
+        swap_directory(self.directory, target)
+        os.remove(self.journal_path)
+        staging_dir = os.path.dirname(self.journal_path)
+        if not os.listdir(staging_dir):
+            os.rmdir(staging_dir)
+
+
+def swap_directory(staging, target):
+    """
+    Replaces `target` with `staging` by renames, so readers never see a half-written folder.
+    """
+    old = f"{staging}.old"
+    if os.path.exists(old):
+        shutil.rmtree(old)
+    if os.path.exists(target):
+        os.replace(target, old)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(staging, target)
+    if os.path.exists(old):
+        shutil.rmtree(old)
+
+
+def restore_directory(staging, target):
+    """Puts back the previous folder if a run died between the two renames of a swap."""
+    old = f"{staging}.old"
+    if not os.path.exists(target) and os.path.exists(old):
+        os.replace(old, target)
@@ -0,0 +1,344 @@
+# exporters.py
+
+import os
+import copy
+import gzip
+import shutil
+import hashlib
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from xml.sax.saxutils import escape
+from cache import load_json_cache, save_json_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# EXPORT_COMPACT=1 — без отступов, пустых элементов и повторяющихся одинаковых элементов
+EXPORT_COMPACT = os.getenv('EXPORT_COMPACT', '0') == '1'
+
+# EXPORT_PRECOMPRESS=1 — рядом с выгрузкой класть .gz (и .br, если установлен brotli),
+# чтобы хостинг отдавал готовые сжатые байты
+EXPORT_PRECOMPRESS = os.getenv('EXPORT_PRECOMPRESS', '0') == '1'
+
+# Хэши выгрузок, для которых уже есть сжатые копии: {абсолютный путь: sha1}
+EXPORT_HASH_CACHE_NAME = 'export_hashes.json'
+
+
+def escape_attrib(value):
+    return escape(str(value), {'"': '&quot;', '\r': '&#13;', '\n': '&#10;', '\t': '&#09;'})
+
+
+def start_tag(element):
+    attrs = ''.join(f' {key}="{escape_attrib(value)}"' for key, value in element.items())
+    return f"<{element.tag}{attrs}>"
+
+
+def compact_element(element):
+    """
+    Returns a copy of the element without formatting whitespace, empty elements
+    and repeated identical children (e.g. a second equal <max_discount>).
+
+    Text with content is kept as is, so descriptions keep their line breaks.
+    """
+    compact = ET.Element(element.tag, element.attrib)
+    if element.text and element.text.strip():
+        compact.text = element.text
+
+    seen = set()
+    for child in element:
+        child = compact_element(child)
+        if child.text is None and not child.attrib and len(child) == 0:
+            continue
+        key = ET.tostring(child)
+        if key in seen:
+            continue
+        seen.add(key)
+        compact.append(child)
+    return compact
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def precompress(path):
+    """
+    Writes `path`.gz (and `path`.br when brotli is installed) at maximum compression.
+
+    Compression is skipped when the file has the same content hash as when its
+    compressed copies were last written.
+
+    Returns:
+        bool: True if the compressed copies were (re)written.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha1(data).hexdigest()
+    key = os.path.abspath(path)
+
+    siblings = [f"{path}.gz"] + ([f"{path}.br"] if brotli else [])
+    hashes = load_json_cache(EXPORT_HASH_CACHE_NAME)
+    if hashes.get(key) == digest and all(os.path.exists(sibling) for sibling in siblings):
+        return False
+
+    # mtime=0: одинаковая выгрузка дает одинаковый .gz, без лишних диффов в git
+    write_atomic(f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli:
+        write_atomic(f"{path}.br", brotli.compress(data, quality=11))
+    elif os.path.exists(f"{path}.br"):
+        # Без brotli старая .br разошлась бы с выгрузкой
+        os.remove(f"{path}.br")
+
+    hashes = load_json_cache(EXPORT_HASH_CACHE_NAME)
+    hashes[key] = digest
+    save_json_cache(EXPORT_HASH_CACHE_NAME, hashes)
+    print(f"Сжатые копии выгрузки обновлены: {', '.join(os.path.basename(sibling) for sibling in siblings)}")
+    return True
+
+
+def duplicate_car(car, n, status="в пути", num=9):
+    """Функция для дублирования элемента 'car' N раз с изменением vin."""
+    duplicates = []
+    vin = car.findtext('vin') or ''
+    # Копии нумеруются по последним цифрам VIN; если там не цифры, копий не делаем
+    if len(vin) < 5 or not (vin[-4:].isascii() and vin[-4:].isdigit()):
+        print(f"Копии 'в пути' не созданы: у VIN '{vin}' на конце не цифры")
+        return duplicates
+    for i in range(n):
+        new_car = copy.deepcopy(car)  # Клонируем текущий элемент car
+        vin = new_car.find('vin').text
+
+        # Извлекаем последние 5 символов
+        vin_suffix = vin[-5:]
+        # Меняем пятую цифру с конца на 9
+        vin_suffix = str(num) + vin_suffix[1:]
+        # Преобразуем последние 5 символов в число и уменьшаем на i
+        new_suffix = str(int(vin_suffix) - i).zfill(5)  # zfill добавляет ведущие нули, если нужно
+        # Собираем новый VIN
+        new_vin = vin[:-5] + new_suffix
+
+        new_car.find('vin').text = new_vin  # Меняем текст VIN
+        availability = new_car.find('availability')
+        if availability is None:
+            availability = ET.SubElement(new_car, 'availability')
+        availability.text = status  # Меняем статус Наличие автомобиля
+        duplicates.append(new_car)
+
+    return duplicates
+
+
+class FeedExporter:
+    """
+    Base class for streaming feed serializers.
+
+    An exporter receives the feed root once, then every car in order, and
+    writes its own output file as it goes. New classifieds formats are added
+    by subclassing and registering the class in EXPORTERS.
+    """
+
+    default_path = None
+
+    def __init__(self, output_path=None, **options):
+        self.output_path = output_path or self.default_path
+        self.options = options
+        self.compact = options.get('compact', EXPORT_COMPACT)
+        self.precompress = options.get('precompress', EXPORT_PRECOMPRESS)
+        self.file = None
+
+    def open(self, root, cars_element):
+        self.file = open(self.output_path, 'w', encoding='utf-8')
+
+    def write_car(self, car):
+        raise NotImplementedError
+
+    def close(self):
+        self.file.close()
+        print(f"Выгрузка сохранена: {self.output_path}")
+        if self.precompress:
+            precompress(self.output_path)
+
+
+class CarsXmlExporter(FeedExporter):
+    """
+    Writes the normalized feed as is, byte for byte like ElementTree.write.
+
+    With the compact option, formatting whitespace, empty elements and
+    repeated identical elements are left out.
+    """
+
+    default_path = './public/cars.xml'
+
+    def open(self, root, cars_element):
+        super().open(root, cars_element)
+        self.root = root
+        self.cars_element = cars_element
+        self.file.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        self.file.write(start_tag(root))
+        self.file.write(self.text(root.text))
+
+        if cars_element is root:
+            self.siblings_after = []
+            return
+
+        children = list(root)
+        index = children.index(cars_element)
+        for sibling in children[:index]:
+            self.file.write(self.serialize(sibling))
+        self.siblings_after = children[index + 1:]
+
+        self.file.write(start_tag(cars_element))
+        self.file.write(self.text(cars_element.text))
+
+    def text(self, value):
+        if self.compact and not (value or '').strip():
+            return ''
+        return escape(value or '')
+
+    def serialize(self, element):
+        if self.compact:
+            element = compact_element(element)
+        return ET.tostring(element, encoding='unicode')
+
+    def write_car(self, car):
+        self.file.write(self.serialize(car))
+
+    def close(self):
+        if self.cars_element is not self.root:
+            self.file.write(f"</{self.cars_element.tag}>")
+            self.file.write(self.text(self.cars_element.tail))
+            for sibling in self.siblings_after:
+                self.file.write(self.serialize(sibling))
+        self.file.write(f"</{self.root.tag}>")
+        super().close()
+
+
+class AvitoExporter(CarsXmlExporter):
+    """
+    Writes the feed for Avito, adding 'в пути' copies of every car.
+
+    As in the old update_cars_avito.py, the copies follow all the original
+    cars; they are spooled to a temporary file until the originals are written.
+    """
+
+    default_path = './public/avito.xml'
+
+    def open(self, root, cars_element):
+        super().open(root, cars_element)
+        self.duplicates = tempfile.TemporaryFile('w+', encoding='utf-8')
+
+    def write_car(self, car):
+        super().write_car(car)
+        for new_car in duplicate_car(car, self.options.get('duplicates', 5)):
+            self.duplicates.write(self.serialize(new_car))
+
+    def close(self):
+        self.duplicates.seek(0)
+        shutil.copyfileobj(self.duplicates, self.file)
+        self.duplicates.close()
+        super().close()
+
+
+class YmlExporter(FeedExporter):
+    """Writes a Yandex YML catalog with one offer per car."""
+
+    default_path = './public/yml.xml'
+
+    def open(self, root, cars_element):
+        super().open(root, cars_element)
+        site_name = self.options.get('site_name', '')
+        self.file.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        self.file.write(f'<yml_catalog date="{datetime.now().strftime("%Y-%m-%d %H:%M")}"><shop>')
+        self.file.write(f"<name>{escape(site_name)}</name><company>{escape(site_name)}</company>")
+        self.file.write(f"<url>https://{escape(site_name)}/</url>")
+        self.file.write('<currencies><currency id="RUR" rate="1"/></currencies>')
+        self.file.write('<categories><category id="1">Автомобили</category></categories>')
+        self.file.write('<offers>')
+
+    def write_car(self, car):
+        def text(name):
+            element = car.find(name)
+            return element.text.strip() if element is not None and element.text else ''
+
+        vin = text('vin')
+        if not vin:
+            return
+
+        name = ' '.join(part for part in (text('mark_id'), text('folder_id'), text('modification_id')) if part)
+        offer = f'<offer id="{escape_attrib(vin)}" available="true">'
+        offer += f"<url>{escape(text('url'))}</url>"
+        offer += f"<price>{escape(text('priceWithDiscount') or text('price'))}</price>"
+        offer += "<currencyId>RUR</currencyId><categoryId>1</categoryId>"
+        images = car.find('images')
+        if images is not None:
+            for image in images.findall('image'):
+                if image.text:
+                    offer += f"<picture>{escape(image.text.strip())}</picture>"
+        offer += f"<name>{escape(name)}</name>"
+        offer += f"<vendor>{escape(text('mark_id'))}</vendor>"
+        offer += f"<model>{escape(text('folder_id'))}</model>"
+        if text('year'):
+            offer += f"<year>{escape(text('year'))}</year>"
+        if text('description'):
+            offer += f"<description>{escape(text('description'))}</description>"
+        offer += '</offer>'
+        self.file.write(offer)
+
+    def close(self):
+        self.file.write('</offers></shop></yml_catalog>')
+        super().close()
+
+
+# Доступные форматы выгрузки: добавление нового канала — это один новый класс
+EXPORTERS = {
+    'cars': CarsXmlExporter,
+    'avito': AvitoExporter,
+    'yml': YmlExporter,
+}
+
+
+def get_exporters(formats, **options):
+    """
+    Creates exporters for a comma-separated list of formats (e.g. "cars,avito").
+
+    Args:
+        formats (str): The format names from EXPORTERS.
+        **options: Options passed to every exporter (e.g. site_name).
+
+    Returns:
+        list: The exporter instances.
+    """
+    exporters = []
+    for name in formats.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in EXPORTERS:
+            raise ValueError(f"Неизвестный формат выгрузки: {name}")
+        exporters.append(EXPORTERS[name](**options))
+    return exporters
+
+
+def export_feeds(root, cars_element, exporters):
+    """
+    Streams the normalized cars through all exporters in a single pass.
+
+    Args:
+        root (Element): The feed root element.
+        cars_element (Element): The element whose children are the cars.
+        exporters (list): The exporters to write.
+    """
+    for exporter in exporters:
+        exporter.open(root, cars_element)
+
+    for car in cars_element:
+        for exporter in exporters:
+            exporter.write_car(car)
+
+    for exporter in exporters:
+        exporter.close()
@@ -0,0 +1,257 @@
+# feed_schema.py
+
+import os
+import sys
+import math
+import xml.etree.ElementTree as ET
+from urllib.parse import urlsplit
+
+# Доля битых машин, при которой фид считается сломанным и запуск останавливается до удаления страниц
+FEED_MAX_INVALID = float(os.getenv('FEED_MAX_INVALID', '0.5'))
+
+# Машины, исключенные из фида, с причинами — для разбора (в репозиторий не коммитится)
+QUARANTINE_PATH = 'quarantine.xml'
+
+# Сколько исключенных машин перечислять в output.txt
+REPORT_LIMIT = 10
+
+
+class FeedSchema:
+    """
+    Required fields, numeric fields and photo URLs of one feed format.
+
+    Field names are the ones in the source feed, before the generator renames
+    them. The checks are compiled into sets once, so validating a car is a
+    single pass over its children.
+    """
+
+    def __init__(self, name, required=(), present=(), numeric=(), images=('images', 'image')):
+        """
+        Args:
+            name (str): The feed format, for the report.
+            required (tuple): Fields that must have non-empty text.
+            present (tuple): Fields that must exist, possibly empty.
+            numeric (tuple): Fields whose non-empty text must be a number.
+            images (tuple): The photo container tag and the photo tag.
+        """
+        self.name = name
+        self.required = tuple(required)
+        self.present = tuple(present)
+        self.numeric = frozenset(numeric)
+        self.wanted = frozenset(required) | frozenset(present) | self.numeric
+        self.images_tag, self.image_tag = images
+
+    def check(self, car):
+        """
+        Validates one car, coercing numbers like "2 000 000" or "15000.0" in place
+        and dropping photos with malformed URLs.
+
+        Returns:
+            tuple: (problems that quarantine the car, number of dropped photos).
+        """
+        fields = {}
+        images = None
+        for child in car:
+            if child.tag in self.wanted and child.tag not in fields:
+                fields[child.tag] = child
+            elif child.tag == self.images_tag and images is None:
+                images = child
+
+        problems = [f"нет {name}" for name in self.present + self.required if name not in fields]
+        problems += [f"пустое {name}" for name in self.required if name in fields and not (fields[name].text or '').strip()]
+
+        for name in self.numeric:
+            element = fields.get(name)
+            if element is None or not (element.text or '').strip():
+                continue
+            number = coerce_number(element.text)
+            if number is None:
+                problems.append(f"{name} не число: {element.text.strip()[:30]}")
+            elif number != element.text:
+                element.text = number
+
+        dropped = 0
+        if images is not None:
+            for image in images.findall(self.image_tag):
+                if not valid_url(image.text):
+                    images.remove(image)
+                    dropped += 1
+        return problems, dropped
+
+
+def coerce_number(text):
+    """
+    Returns the text if int() accepts it, a cleaned integer string if it can be coerced, or None.
+
+    >>> coerce_number('2040000'), coerce_number('1 500 000'), coerce_number('15000.0')
+    ('2040000', '1500000', '15000')
+    >>> coerce_number('дорого'), coerce_number('15000.5'), coerce_number('nan'), coerce_number('-inf'), coerce_number('1e999')
+    (None, None, None, None, None)
+    """
+    try:
+        int(text)
+        return text
+    except ValueError:
+        pass
+    cleaned = text.replace('\xa0', '').replace(' ', '').replace(',', '.')
+    try:
+        number = float(cleaned)
+    except ValueError:
+        return None
+    # nan и inf — не цена и не пробег: int() на них падает
+    if not math.isfinite(number) or number != int(number):
+        return None
+    return str(int(number))
+
+
+def valid_url(url):
+    if not url or not url.strip():
+        return False
+    parts = urlsplit(url.strip())
+    return parts.scheme in ('http', 'https') and bool(parts.netloc)
+
+
+# Схемы по вариантам генератора. Год, комплектация и модификация в present:
+# create_file читает их в описании без проверки и падает, если тега нет
+SCHEMAS = {
+    'cars': FeedSchema(
+        'cars',
+        required=('vin', 'folder_id', 'color'),
+        present=('price', 'max_discount', 'year', 'complectation_name', 'modification_id'),
+        numeric=('price', 'max_discount', 'total', 'run', 'year'),
+    ),
+    'carcopy': FeedSchema(
+        'carcopy',
+        required=('vin', 'model', 'color'),
+        present=('price', 'max-discount', 'year', 'complectation', 'version'),
+        numeric=('price', 'max-discount', 'run', 'year'),
+        images=('photos', 'photo'),
+    ),
+    'vehicles': FeedSchema(
+        'vehicles',
+        required=('vin', 'model', 'color'),
+        # 'сomplectation-name' с кириллической «с» — тег, который переименовывает генератор
+        present=('price', 'tradein-discount', 'credit-discount', 'year', 'сomplectation-name', 'modification'),
+        numeric=('price', 'tradein-discount', 'credit-discount', 'run', 'year'),
+        images=('photos', 'photo'),
+    ),
+    'maxposter': FeedSchema(
+        'maxposter',
+        required=('vin', 'model', 'bodyColor'),
+        present=('price', 'creditDiscount', 'tradeinDiscount', 'priceWithDiscount', 'year', 'complectation', 'modification'),
+        numeric=('price', 'creditDiscount', 'tradeinDiscount', 'priceWithDiscount', 'mileage', 'year'),
+        images=('photos', 'photo'),
+    ),
+}
+
+
+class FeedValidator:
+    """
+    Checks the whole feed before anything is deleted, downloaded or rendered.
+
+    Bad cars are taken out of the feed and saved to quarantine.xml, the rest
+    are processed as usual. If the container is missing or too many cars are
+    bad, the run stops while the current pages are still in place.
+
+    A car without <year> would crash create_file on its description, so it
+    is quarantined and the other cars go on:
+
+    >>> import tempfile
+    >>> fields = ('vin', 'folder_id', 'color', 'price', 'max_discount', 'year', 'complectation_name', 'modification_id')
+    >>> def car(vin, *missing):
+    ...     element = ET.Element('car')
+    ...     for name in fields:
+    ...         if name not in missing:
+    ...             ET.SubElement(element, name).text = vin if name == 'vin' else '2024'
+    ...     ET.SubElement(element, 'description').text = 'Автомобиль в наличии'
+    ...     return element
+    >>> cars = ET.Element('cars')
+    >>> cars.extend([car('XTA1'), car('XTA2', 'year'), car('XTA3')])
+    >>> validator = FeedValidator('cars')
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     validator.validate(cars, os.path.join(directory, 'quarantine.xml'))
+    Исключено из фида машин: 1 (подробности в quarantine.xml)
+    XTA2: нет year
+    1
+    >>> [element.findtext('vin') for element in cars]
+    ['XTA1', 'XTA3']
+    """
+
+    def __init__(self, schema):
+        self.schema = SCHEMAS[schema] if isinstance(schema, str) else schema
+        self.quarantined = []
+        self.dropped_images = 0
+
+    def validate(self, cars_element, quarantine_path=QUARANTINE_PATH, fatal=True):
+        """
+        Validates the cars in place and quarantines the bad ones.
+
+        Args:
+            cars_element (Element): The feed element with the cars.
+            quarantine_path (str): Where to save the quarantined cars.
+            fatal (bool): Exit on a broken feed; the watcher passes False to
+                skip the update and keep serving the current pages.
+
+        Returns:
+            int | None: The number of quarantined cars, or None if the feed
+            was rejected as a whole.
+        """
+        if cars_element is None:
+            print(f"В фиде нет списка машин для формата {self.schema.name}, страницы не тронуты")
+            if fatal:
+                sys.exit(1)
+            return None
+
+        cars = list(cars_element)
+        for index, car in enumerate(cars):
+            problems, dropped = self.schema.check(car)
+            self.dropped_images += dropped
+            if problems:
+                self.quarantined.append((index, car, problems))
+
+        if cars and len(self.quarantined) > len(cars) * FEED_MAX_INVALID:
+            self.print_report()
+            print(f"Битых машин {len(self.quarantined)} из {len(cars)}: фид похож на сломанный, страницы не тронуты")
+            if fatal:
+                sys.exit(1)
+            return None
+
+        for _, car, _ in self.quarantined:
+            cars_element.remove(car)
+
+        if self.quarantined:
+            quarantine = ET.Element('quarantine')
+            for index, car, problems in self.quarantined:
+                car.set('reason', '; '.join(problems))
+                car.set('index', str(index))
+                quarantine.append(car)
+            ET.ElementTree(quarantine).write(quarantine_path, encoding='utf-8', xml_declaration=True)
+        elif os.path.exists(quarantine_path):
+            os.remove(quarantine_path)
+
+        self.print_report()
+        return len(self.quarantined)
+
+    def report_lines(self):
+        lines = []
+        if self.quarantined:
+            lines.append(f"Исключено из фида машин: {len(self.quarantined)} (подробности в {QUARANTINE_PATH})")
+            for index, car, problems in self.quarantined[:REPORT_LIMIT]:
+                vin = (car.findtext('vin') or '').strip() or f"№{index + 1}"
+                lines.append(f"{vin}: {', '.join(problems)}")
+        if self.dropped_images:
+            lines.append(f"Убрано фото с неверным адресом: {self.dropped_images}")
+        return lines
+
+    def print_report(self):
+        lines = self.report_lines()
+        if lines:
+            print("\n".join(lines))
+
+    def report(self, output_path='output.txt'):
+        """Appends the bulk report to output.txt. Returns True if any cars were quarantined."""
+        lines = self.report_lines()
+        if lines:
+            with open(output_path, 'a') as file:
+                file.write("\n".join(lines) + "\n")
+        return bool(self.quarantined)
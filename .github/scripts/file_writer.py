@@ -0,0 +1,150 @@
+# file_writer.py
+
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+FILE_WRITER_WORKERS = 4
+
+
+def read_bytes(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+class FileWriter:
+    """
+    Writes files from a small pool of I/O threads.
+
+    Every file goes to a temporary name and is renamed into place, so readers
+    (e.g. a running `astro dev`) never see a half-written page. Files whose
+    bytes did not change are left alone. Until a write lands, `read_bytes`,
+    `read_text` and `exists` answer from memory, so the generator can keep
+    merging into a page it has just queued.
+    """
+
+    def __init__(self, workers=FILE_WRITER_WORKERS):
+        self.workers = workers
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.queued = {}
+        self.futures = []
+        self.mirrors = []
+        self.changed = {}
+
+    def mirror(self, staging, target):
+        """
+        Compares files under `staging` with their counterparts under `target`.
+
+        A staged file identical to the live one is hard-linked from it, so it
+        keeps its inode and mtime when the staging folder is swapped in.
+        """
+        self.mirrors.append((os.path.normpath(staging), os.path.normpath(target)))
+
+    def baseline_path(self, path):
+        path = os.path.normpath(path)
+        for staging, target in self.mirrors:
+            if path.startswith(staging + os.sep):
+                return os.path.join(target, os.path.relpath(path, staging))
+        return None
+
+    def write(self, path, data):
+        """
+        Queues a file write.
+
+        Args:
+            path (str): The destination path.
+            data (str | bytes): The content; text is written as UTF-8.
+
+        Returns:
+            Future: Completes when the latest content of `path` is on disk.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self.lock:
+            self.pending[path] = data
+            future = self.queued.get(path)
+            if future is None:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.workers)
+                future = self.queued[path] = self.executor.submit(self.write_pending, path)
+            self.futures.append(future)
+        return future
+
+    def write_pending(self, path):
+        # Пока файл записывался, могли прийти новые данные — пишем, пока не догоним
+        while True:
+            with self.lock:
+                data = self.pending[path]
+            changed = self.write_file(path, data)
+            with self.lock:
+                self.changed[path] = changed
+                if self.pending[path] is data:
+                    del self.pending[path]
+                    del self.queued[path]
+                    return
+
+    def write_file(self, path, data):
+        """Writes `data` atomically. Returns False if the (live) file already had these bytes."""
+        current = read_bytes(path)
+        baseline = self.baseline_path(path)
+        baseline_data = read_bytes(baseline) if baseline else current
+        if current == data:
+            return baseline_data != data
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if baseline and baseline_data == data:
+            try:
+                os.link(baseline, tmp_path)
+            except OSError:
+                shutil.copy2(baseline, tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        os.replace(tmp_path, path)
+        return baseline_data != data
+
+    def read_bytes(self, path):
+        with self.lock:
+            data = self.pending.get(path)
+        return data if data is not None else read_bytes(path)
+
+    def read_text(self, path):
+        data = self.read_bytes(path)
+        if data is None:
+            raise FileNotFoundError(path)
+        return data.decode('utf-8')
+
+    def exists(self, path):
+        with self.lock:
+            if path in self.pending:
+                return True
+        return os.path.exists(path)
+
+    def flush(self):
+        """Waits for all queued writes. Raises the first write error."""
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+    def written(self):
+        """Number of files whose bytes actually changed."""
+        return sum(1 for changed in self.changed.values() if changed)
+
+    def report(self):
+        written = self.written()
+        print(f"Файлов записано: {written}, без изменений: {len(self.changed) - written}")
+
+
+def finished(futures):
+    """True if all the given writes are on disk."""
+    return all(future.done() and future.exception() is None for future in futures)
+
+
+# Общий писатель для страниц и превью
+file_writer = FileWriter()
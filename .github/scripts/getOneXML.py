@@ -2,14 +2,62 @@
 import os
 import requests
 import argparse
+from datetime import datetime
 from lxml import etree
 
+# Что делать с одним VIN из нескольких источников
+DUPLICATE_POLICIES = ('first', 'freshest', 'lowest-price')
+
 def download_xml(url):
     response = requests.get(url)
     response.raise_for_status()  # Если возникла ошибка, будет выброшено исключение
     return response.content
 
-def merge_xml_files(xml_contents, xpath):
+def child_text(element, tag):
+    child = element.find(tag)
+    return child.text.strip() if child is not None and child.text else ''
+
+
+def child_int(element, tag):
+    try:
+        return int(float(child_text(element, tag)))
+    except ValueError:
+        return 0
+
+
+def parse_date(value):
+    """Parses an ISO-like date for comparison; unknown formats compare as plain strings."""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None).isoformat()
+    except ValueError:
+        return value
+
+
+def prefer(candidate, current, policy, fresh_field):
+    """True if `candidate` should replace `current` for the same VIN."""
+    if policy == 'freshest':
+        candidate_date = child_text(candidate, fresh_field)
+        current_date = child_text(current, fresh_field)
+        return bool(candidate_date) and (not current_date or parse_date(candidate_date) > parse_date(current_date))
+    if policy == 'lowest-price':
+        def sale_price(car):
+            return child_int(car, 'price') - child_int(car, 'max_discount')
+        return child_int(candidate, 'price') > 0 and (child_int(current, 'price') <= 0 or sale_price(candidate) < sale_price(current))
+    return False
+
+
+def merge_xml_files(xml_contents, xpath, policy='first', fresh_field='updated_at'):
+    """
+    Merges the elements found by `xpath` from several feeds into one tree.
+
+    A car seen again under the same VIN replaces the kept one only if the
+    policy prefers it ('first' keeps the first, 'freshest' the latest
+    `fresh_field` date, 'lowest-price' the lowest price minus max_discount),
+    and it keeps the position of the first occurrence.
+
+    Returns:
+        tuple: (merged root element, {vin: [source numbers]} for duplicated VINs).
+    """
     # Определяем путь до родительского элемента для объединения
     path = xpath.strip('/').split('/')[:-1]
     root_path = path[0]
@@ -18,7 +66,11 @@ def merge_xml_files(xml_contents, xpath):
     # Создаем корневой элемент на основе родительского пути
     merged_root = etree.Element(root_path)
 
-    for content in xml_contents:
+    # VIN -> (элемент, номер источника); номера всех источников дубликата
+    vin_index = {}
+    duplicates = {}
+
+    for source, content in enumerate(xml_contents, start=1):
         # Убрать BOM, если он присутствует
         if content.startswith(b'\xef\xbb\xbf'):
             content = content[3:]
@@ -43,16 +95,35 @@ def merge_xml_files(xml_contents, xpath):
             parent_elements = [parent_element]
         
         for element in elements:
-            # Добавляем элементы в соответствующую родительскую структуру
-            parent_elements[0].append(element)
-    
-    return merged_root
+            vin = child_text(element, 'vin').upper()
+            if not vin:
+                parent_elements[0].append(element)
+                continue
+
+            if vin not in vin_index:
+                # Добавляем элементы в соответствующую родительскую структуру
+                parent_elements[0].append(element)
+                vin_index[vin] = (element, source)
+                continue
+
+            current, current_source = vin_index[vin]
+            duplicates.setdefault(vin, [current_source]).append(source)
+            if prefer(element, current, policy, fresh_field):
+                current.getparent().replace(current, element)
+                vin_index[vin] = (element, source)
+
+    for vin, sources in duplicates.items():
+        duplicates[vin] = {'sources': sources, 'kept': vin_index[vin][1]}
+
+    return merged_root, duplicates
 
 
 def main():
     parser = argparse.ArgumentParser(description='Download and merge XML files.')
     parser.add_argument('--xpath', default='//data/cars/car', help='XPath to the elements to be merged')
     parser.add_argument('--output', default='merged_output.xml', help='Output file name')
+    parser.add_argument('--on-duplicate', choices=DUPLICATE_POLICIES, default=os.getenv('DUPLICATE_VIN_POLICY', 'first'), help='Which car to keep when a VIN comes from several feeds')
+    parser.add_argument('--fresh-field', default='updated_at', help='Date element compared by the "freshest" policy')
     args = parser.parse_args()
 
     # env_xml_url = os.getenv('ENV_XML_URL', '')
@@ -64,7 +135,12 @@ def main():
         return
 
     xml_contents = [download_xml(url) for url in urls]
-    merged_root = merge_xml_files(xml_contents, args.xpath)
+    merged_root, duplicates = merge_xml_files(xml_contents, args.xpath, args.on_duplicate, args.fresh_field)
+
+    for vin, duplicate in duplicates.items():
+        print(f"Дубликат VIN {vin}: источники {duplicate['sources']}, оставлен из источника {duplicate['kept']}")
+    if duplicates:
+        print(f"Дубликатов VIN: {len(duplicates)}, лишних записей убрано: {sum(len(d['sources']) - 1 for d in duplicates.values())}")
 
     merged_tree = etree.ElementTree(merged_root)
     merged_tree.write(args.output, encoding="UTF-8", xml_declaration=True, pretty_print=True)
@@ -0,0 +1,94 @@
+# http_cache.py
+
+import os
+import json
+import hashlib
+import requests
+from cache import CACHE_DIR
+
+# Общий HTTP-кэш (фиды) и кэш превью по URL исходного изображения.
+# Несколько сайтов могут указывать на одни и те же папки.
+HTTP_CACHE_DIR = os.getenv('HTTP_CACHE_DIR') or os.path.join(CACHE_DIR, 'http')
+THUMBS_CACHE_DIR = os.getenv('THUMBS_CACHE_DIR')
+
+
+def url_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def fetch_cached(url, timeout=60):
+    """
+    Downloads a URL through the on-disk HTTP cache.
+
+    A cached copy is revalidated with If-None-Match / If-Modified-Since, so an
+    unchanged feed costs one conditional request instead of a full download.
+
+    Args:
+        url (str): The URL to fetch.
+        timeout (int): Request timeout in seconds.
+
+    Returns:
+        tuple: (path to the cached body, True if the content changed since the last fetch).
+    """
+    os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+    key = url_key(url)
+    body_path = os.path.join(HTTP_CACHE_DIR, f"{key}.body")
+    meta_path = os.path.join(HTTP_CACHE_DIR, f"{key}.json")
+
+    meta = {}
+    if os.path.exists(meta_path) and os.path.exists(body_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return body_path, False
+    response.raise_for_status()
+
+    content = response.content
+    content_hash = hashlib.sha1(content).hexdigest()
+    changed = content_hash != meta.get('sha1')
+
+    tmp_path = f"{body_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, body_path)
+
+    meta = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'sha1': content_hash,
+    }
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+    return body_path, changed
+
+
+def get_cached_thumb(img_url):
+    """Returns the shared cached thumbnail for a source image URL, if there is one."""
+    if not THUMBS_CACHE_DIR:
+        return None
+    path = os.path.join(THUMBS_CACHE_DIR, f"{url_key(img_url)}.webp")
+    return path if os.path.exists(path) else None
+
+
+def store_cached_thumb(img_url, thumb_data):
+    """Puts a freshly created thumbnail (WEBP bytes) into the shared cache."""
+    if not THUMBS_CACHE_DIR:
+        return
+    os.makedirs(THUMBS_CACHE_DIR, exist_ok=True)
+    path = os.path.join(THUMBS_CACHE_DIR, f"{url_key(img_url)}.webp")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(thumb_data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,218 @@
+# image_fetcher.py
+
+import time
+import threading
+import requests
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+# (соединение, чтение) в секундах — медленный хост не держит весь запуск
+FETCH_TIMEOUT = (5, 20)
+FETCH_WORKERS = 16
+FETCH_RETRIES = 1
+
+# Параллельность на хост: растет на единицу за "окно" удачных ответов, при ошибке делится пополам
+HOST_INITIAL_LIMIT = 2
+HOST_MAX_LIMIT = 8
+
+# Ответ медленнее этого считается признаком перегрузки хоста
+HOST_SLOW_SECONDS = 5
+
+# После стольких ошибок подряд хост отключается, его изображения ждут следующего запуска
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 60
+
+# Retry-After дольше этого не ждем — откладываем до следующего запуска
+RETRY_AFTER_MAX = 30
+
+
+class HostDeferred(Exception):
+    """Raised when a host is throttled or broken and its image is left for the next run."""
+
+
+def parse_retry_after(value):
+    """Returns Retry-After in seconds (number or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostState:
+    """Adaptive concurrency limit, latency and circuit breaker of one image host."""
+
+    def __init__(self, host):
+        self.host = host
+        self.limit = float(HOST_INITIAL_LIMIT)
+        self.active = 0
+        self.blocked_until = 0.0
+        self.failures = 0
+        self.opened_at = None
+        self.requests = 0
+        self.errors = 0
+        self.deferred = 0
+        self.latency = None
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if self.opened_at is not None and now - self.opened_at < BREAKER_COOLDOWN:
+                    self.deferred += 1
+                    raise HostDeferred(f"хост {self.host} отключен после {self.failures} ошибок подряд")
+                wait = self.blocked_until - now
+                if wait > RETRY_AFTER_MAX:
+                    self.deferred += 1
+                    raise HostDeferred(f"хост {self.host} просит подождать {wait:.0f} с")
+                # После паузы автомата — один пробный запрос
+                limit = 1 if self.opened_at is not None else int(self.limit)
+                if wait <= 0 and self.active < limit:
+                    self.active += 1
+                    return
+                self.condition.wait(wait if wait > 0 else None)
+
+    def release(self, latency=None, error=False, retry_after=None):
+        with self.condition:
+            self.active -= 1
+            self.requests += 1
+            if latency is not None:
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+            if error or (latency or 0) > HOST_SLOW_SECONDS:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(HOST_MAX_LIMIT), self.limit + 1 / self.limit)
+
+            if error:
+                self.errors += 1
+                self.failures += 1
+                if self.failures >= BREAKER_FAILURES or self.opened_at is not None:
+                    self.opened_at = time.monotonic()
+            else:
+                self.failures = 0
+                self.opened_at = None
+
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.condition.notify_all()
+
+
+class ImageFetcher:
+    """
+    Downloads source images with per-host limits.
+
+    Each host gets its own AIMD concurrency limit, honors Retry-After and has
+    a circuit breaker, so a slow or throttling CDN is contained while the
+    healthy hosts are fetched at full speed.
+    """
+
+    def __init__(self, workers=FETCH_WORKERS):
+        self.workers = workers
+        self.executor = None
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # Исходники последней машины, скачанные ради хэшей: превью берет их отсюда, а не со второго скачивания
+        self.kept = {}
+
+    def host_state(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostState(host)
+            return self.hosts[host]
+
+    def session(self):
+        # Своя сессия в каждом потоке: keep-alive без общего состояния
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def fetch(self, url):
+        """
+        Downloads one image.
+
+        Returns:
+            bytes: The response body.
+
+        Raises:
+            HostDeferred: The host is throttled or broken, try again next run.
+            requests.RequestException: The download failed.
+        """
+        state = self.host_state(url)
+        for attempt in range(FETCH_RETRIES + 1):
+            last_attempt = attempt == FETCH_RETRIES
+            state.acquire()
+            started = time.monotonic()
+            try:
+                response = self.session().get(url, timeout=FETCH_TIMEOUT)
+            except requests.RequestException:
+                state.release(error=True)
+                if last_attempt:
+                    raise
+                continue
+
+            latency = time.monotonic() - started
+            if response.status_code == 429 or response.status_code >= 500:
+                state.release(latency, error=True, retry_after=parse_retry_after(response.headers.get('Retry-After')))
+                if last_attempt:
+                    response.raise_for_status()
+                continue
+
+            # 404 и прочие 4xx — проблема изображения, а не хоста
+            state.release(latency)
+            response.raise_for_status()
+            return response.content
+
+    def fetch_many(self, urls, keep=False):
+        """
+        Downloads several images in parallel.
+
+        Images kept by the previous call are returned without downloading them
+        again, and are released once handed out.
+
+        Args:
+            urls (list): The image URLs.
+            keep (bool): Keep the downloaded bytes for the next call, replacing
+                whatever was kept before, so at most one car's gallery stays
+                in memory.
+
+        Returns:
+            dict: {url: bytes or the exception raised for it}.
+        """
+        urls = list(dict.fromkeys(urls))
+        results = {url: self.kept.pop(url) for url in urls if url in self.kept}
+        urls = [url for url in urls if url not in results]
+        if urls:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+            def fetch(url):
+                try:
+                    return url, self.fetch(url)
+                except Exception as e:
+                    return url, e
+
+            results.update(self.executor.map(fetch, urls))
+        if keep:
+            self.kept = {url: content for url, content in results.items() if isinstance(content, bytes)}
+        return results
+
+    def report(self):
+        for host, state in sorted(self.hosts.items()):
+            latency = f"{state.latency:.2f} с" if state.latency is not None else "—"
+            breaker = ", отключен" if state.opened_at is not None else ""
+            print(f"Хост {host}: запросов {state.requests}, ошибок {state.errors}, отложено {state.deferred}, "
+                  f"задержка {latency}, параллельность {int(state.limit)}{breaker}")
+
+
+# Общий загрузчик исходных изображений для превью
+image_fetcher = ImageFetcher()
@@ -0,0 +1,107 @@
+# image_hash.py
+
+import os
+from io import BytesIO
+from PIL import Image
+from cache import load_json_cache, save_json_cache
+from image_fetcher import image_fetcher
+
+# IMAGE_DEDUP=1 — убирать со страницы почти одинаковые фото под разными URL
+IMAGE_DEDUP = os.getenv('IMAGE_DEDUP', '0') == '1'
+
+# Кэш перцептивных хэшей по URL: {url: "16 hex"}
+HASH_CACHE_NAME = 'image_hash.json'
+
+# Сколько из 64 бит могут отличаться у одного и того же фото (пережатие, водяной знак)
+DUPLICATE_DISTANCE = 4
+
+hash_cache = None
+
+
+def get_hash_cache():
+    global hash_cache
+    if hash_cache is None:
+        hash_cache = load_json_cache(HASH_CACHE_NAME)
+    return hash_cache
+
+
+def save_hash_cache():
+    if hash_cache is not None:
+        # Кэш может быть общим для нескольких сайтов: дописываем к тому, что уже на диске
+        cache = load_json_cache(HASH_CACHE_NAME)
+        cache.update(hash_cache)
+        save_json_cache(HASH_CACHE_NAME, cache)
+
+
+def dhash(image):
+    """
+    Computes a 64-bit difference hash of an image.
+
+    Args:
+        image (Image): The decoded PIL image.
+
+    Returns:
+        str: The hash as 16 hex digits.
+    """
+    # JPEG декодируется сразу в уменьшенном виде
+    image.draft('L', (64, 64))
+    pixels = list(image.convert('L').resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = value << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{value:016x}"
+
+
+def image_hashes(image_urls):
+    """
+    Returns the perceptual hashes of the given images, using the cache across runs.
+
+    Returns:
+        dict: {url: hash or None if the image could not be loaded}.
+    """
+    cache = get_hash_cache()
+    missing = [url for url in dict.fromkeys(image_urls) if url and url not in cache]
+
+    # Скачанное остается у загрузчика: превью этих же фото не скачивают их второй раз
+    for img_url, content in image_fetcher.fetch_many(missing, keep=True).items():
+        try:
+            if isinstance(content, Exception):
+                raise content
+            with Image.open(BytesIO(content)) as image:
+                cache[img_url] = dhash(image)
+        except Exception as e:
+            # Неудачные попытки не кэшируем, повторим в следующий запуск
+            print(f"Ошибка при вычислении хэша изображения {img_url}: {e}")
+
+    return {url: cache.get(url) for url in image_urls}
+
+
+def dedupe_images(image_urls, known_urls=()):
+    """
+    Drops images that are near-identical to an earlier one on the same page.
+
+    Args:
+        image_urls (list): The new image URLs, in order.
+        known_urls (list): URLs already on the page.
+
+    Returns:
+        list: The new URLs that are not duplicates, in order.
+    """
+    hashes = image_hashes(list(known_urls) + list(image_urls))
+    seen_urls = set(known_urls)
+    seen_hashes = [int(hashes[url], 16) for url in known_urls if hashes.get(url)]
+
+    unique = []
+    for img_url in image_urls:
+        if img_url in seen_urls:
+            continue
+        seen_urls.add(img_url)
+        value = hashes.get(img_url)
+        if value is not None:
+            value = int(value, 16)
+            if any(bin(value ^ seen).count('1') <= DUPLICATE_DISTANCE for seen in seen_hashes):
+                continue
+            seen_hashes.append(value)
+        unique.append(img_url)
+    return unique
@@ -0,0 +1,114 @@
+# image_probe.py
+
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from PIL import ImageFile
+from cache import load_json_cache, save_json_cache
+
+# Кэш размеров по URL: {url: [width, height, format]}
+PROBE_CACHE_NAME = 'image_probe.json'
+
+# Сколько байт запрашиваем за один Range-запрос
+PROBE_RANGE_SIZE = 16 * 1024
+
+# Дальше этого предела не читаем, даже если заголовок так и не разобран
+PROBE_MAX_BYTES = 256 * 1024
+
+PROBE_TIMEOUT = 10
+PROBE_WORKERS = 8
+
+probe_cache = None
+
+
+def get_probe_cache():
+    global probe_cache
+    if probe_cache is None:
+        probe_cache = load_json_cache(PROBE_CACHE_NAME)
+    return probe_cache
+
+
+def save_probe_cache():
+    if probe_cache is not None:
+        # Кэш может быть общим для нескольких сайтов: дописываем к тому, что уже на диске
+        cache = load_json_cache(PROBE_CACHE_NAME)
+        cache.update(probe_cache)
+        save_json_cache(PROBE_CACHE_NAME, cache)
+
+
+def probe_image(img_url):
+    """
+    Reads only the header of a remote image to get its dimensions.
+
+    Uses HTTP Range requests; if the server ignores Range and returns the whole
+    file, the body is streamed and the connection is dropped as soon as the
+    header is parsed.
+
+    Args:
+        img_url (str): The image URL.
+
+    Returns:
+        list: [width, height, format], or None if the header could not be parsed.
+    """
+    parser = ImageFile.Parser()
+    received = 0
+
+    while received < PROBE_MAX_BYTES:
+        headers = {'Range': f"bytes={received}-{received + PROBE_RANGE_SIZE - 1}"}
+        with requests.get(img_url, headers=headers, stream=True, timeout=PROBE_TIMEOUT) as response:
+            if response.status_code == 416:
+                break
+            response.raise_for_status()
+
+            for chunk in response.iter_content(4096):
+                parser.feed(chunk)
+                received += len(chunk)
+                if parser.image is not None or received >= PROBE_MAX_BYTES:
+                    break
+
+            # 200 вместо 206 — сервер отдал файл целиком, дальше запрашивать нечего
+            if parser.image is not None or response.status_code != 206:
+                break
+
+            # Сервер вернул меньше, чем просили — файл закончился
+            if received % PROBE_RANGE_SIZE:
+                break
+
+    if parser.image is None:
+        return None
+
+    image = parser.image
+    return [image.width, image.height, (image.format or '').lower()]
+
+
+def probe_images(image_urls):
+    """
+    Returns the dimensions of the given images, using the cache across runs.
+
+    Args:
+        image_urls (list): The image URLs.
+
+    Returns:
+        list: A dict with 'width', 'height' and 'format' for each URL (empty if unknown).
+    """
+    cache = get_probe_cache()
+    missing = [url for url in dict.fromkeys(image_urls) if url and url not in cache]
+
+    def probe(img_url):
+        try:
+            return img_url, probe_image(img_url)
+        except Exception as e:
+            print(f"Ошибка при определении размеров изображения {img_url}: {e}")
+            return img_url, None
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as executor:
+            for img_url, size in executor.map(probe, missing):
+                # Неудачные попытки не кэшируем, повторим в следующий запуск
+                if size is not None:
+                    cache[img_url] = size
+
+    sizes = []
+    for img_url in image_urls:
+        size = cache.get(img_url)
+        sizes.append({'width': size[0], 'height': size[1], 'format': size[2]} if size else {})
+    return sizes
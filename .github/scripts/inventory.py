@@ -0,0 +1,133 @@
+# inventory.py
+
+import os
+import json
+from array import array
+from operator import sub
+
+# Сводка по моделям для сайта (наличие, цены, годы)
+SUMMARY_PATH = 'src/data/cars-summary.json'
+
+
+def to_int(element, default=0):
+    if element is None or element.text is None:
+        return default
+    try:
+        return int(float(element.text))
+    except ValueError:
+        return default
+
+
+class InventoryTable:
+    """
+    Columnar table of normalized cars.
+
+    Numeric fields are kept in typed arrays, one per column, and strings
+    (model, trim, page slug) are stored as integer codes, so aggregates are
+    computed over whole columns instead of per car.
+    """
+
+    def __init__(self):
+        self.models = []
+        self.trims = []
+        self.slugs = []
+        self.vins = []
+        self.codes = {'model': {}, 'trim': {}, 'slug': {}}
+
+        self.model = array('l')
+        self.trim = array('l')
+        self.slug = array('l')
+        self.price = array('q')
+        self.discount = array('q')
+        self.sale_price = array('q')
+        self.run = array('q')
+        self.year = array('l')
+        self.total = array('l')
+
+    def __len__(self):
+        return len(self.price)
+
+    def encode(self, kind, values, value):
+        codes = self.codes[kind]
+        if value not in codes:
+            codes[value] = len(values)
+            values.append(value)
+        return codes[value]
+
+    def add_car(self, car, unique_id):
+        """Appends a normalized car element as a new row."""
+        model = (car.findtext('folder_id') or '').strip()
+        trim = (car.findtext('complectation_name') or '').strip()
+
+        self.model.append(self.encode('model', self.models, model))
+        self.trim.append(self.encode('trim', self.trims, (model, trim)))
+        self.slug.append(self.encode('slug', self.slugs, unique_id))
+        self.vins.append((car.findtext('vin') or '').strip())
+        self.price.append(to_int(car.find('price')))
+        self.discount.append(to_int(car.find('max_discount')))
+        self.sale_price.append(to_int(car.find('priceWithDiscount')))
+        self.run.append(to_int(car.find('run')))
+        self.year.append(to_int(car.find('year')))
+        self.total.append(to_int(car.find('total'), 1))
+
+    def sale_prices(self):
+        """Returns the price with discount column, filling gaps from price - discount."""
+        computed = array('q', map(sub, self.price, self.discount))
+        return array('q', (sale or fallback for sale, fallback in zip(self.sale_price, computed)))
+
+    def group_by(self, column):
+        """
+        Sorts all columns by the codes in `column` once.
+
+        Returns:
+            tuple: (sorted columns dict, list of (code, start, end) group bounds).
+        """
+        order = sorted(range(len(self)), key=column.__getitem__)
+        sale_prices = self.sale_prices()
+        columns = {
+            'price': array('q', map(sale_prices.__getitem__, order)),
+            'discount': array('q', map(self.discount.__getitem__, order)),
+            'run': array('q', map(self.run.__getitem__, order)),
+            'year': array('l', map(self.year.__getitem__, order)),
+            'total': array('l', map(self.total.__getitem__, order)),
+        }
+        keys = array('l', map(column.__getitem__, order))
+
+        groups = []
+        start = 0
+        for index in range(1, len(keys) + 1):
+            if index == len(keys) or keys[index] != keys[start]:
+                groups.append((keys[start], start, index))
+                start = index
+        return columns, groups
+
+    def aggregate(self, column):
+        """Computes count/price/discount/year aggregates per code of `column`."""
+        columns, groups = self.group_by(column)
+        result = {}
+        for code, start, end in groups:
+            prices = columns['price'][start:end]
+            result[code] = {
+                'count': sum(columns['total'][start:end]),
+                'min_price': min(prices),
+                'max_price': max(prices),
+                'max_discount': max(columns['discount'][start:end]),
+                'years': sorted(set(columns['year'][start:end]) - {0}),
+            }
+        return result
+
+    def summary(self):
+        """Returns per-model aggregates with nested per-trim aggregates."""
+        models = {self.models[code]: stats for code, stats in self.aggregate(self.model).items()}
+        for code, stats in self.aggregate(self.trim).items():
+            model, trim = self.trims[code]
+            models[model].setdefault('trims', {})[trim] = stats
+        return {'total': sum(self.total), 'models': models}
+
+
+def write_summary(inventory, path=SUMMARY_PATH):
+    """Writes the per-model summary as compact JSON for the site."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(inventory.summary(), f, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    print(f"Сводка по моделям сохранена: {path}")
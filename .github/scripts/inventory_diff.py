@@ -0,0 +1,174 @@
+# inventory_diff.py
+
+import os
+import re
+import glob
+import json
+import hashlib
+
+# Снимок склада коммитится вместе со страницами, поэтому всегда соответствует опубликованному
+SNAPSHOT_PATH = 'src/data/cars-snapshot.json'
+
+# Итог для workflow: менялось ли что-то и что именно
+CHANGES_PATH = 'changes.json'
+
+# Сколько машин каждого вида перечислять в уведомлении
+REPORT_LIMIT = 10
+
+# Выгрузки и данные списка; страницы и превью считает file_writer, .gz/.br повторяют свои .xml
+OUTPUT_GLOBS = (
+    'public/*.xml',
+    'src/data/cars-summary.json',
+    'src/data/cars-index.json',
+    'public/data/cars/**/*.json',
+)
+
+# Дата формирования в yml.xml меняется каждый запуск и сама по себе изменением не считается
+VOLATILE_BYTES = re.compile(rb'<yml_catalog date="[^"]*"')
+
+
+def inventory_snapshot(inventory):
+    """
+    Builds a compact snapshot of the inventory keyed by VIN.
+
+    Cars without a VIN (or with a repeated one) are keyed by VIN, page id and
+    their number on that page, so every row gets a stable key.
+
+    Returns:
+        dict: {key: [unique_id, price, sale_price, discount, total]}.
+    """
+    sale_prices = inventory.sale_prices()
+    snapshot = {}
+    for row, vin in enumerate(inventory.vins):
+        unique_id = inventory.slugs[inventory.slug[row]]
+        key = vin
+        number = 1
+        while not key or key in snapshot:
+            key = f"{vin}@{unique_id}#{number}"
+            number += 1
+        snapshot[key] = [unique_id, inventory.price[row], sale_prices[row], inventory.discount[row], inventory.total[row]]
+    return snapshot
+
+
+def diff_snapshots(previous, current):
+    """
+    Compares two snapshots in one pass over each.
+
+    Returns:
+        dict: Lists of added and removed keys and of [key, old, new] for
+        changed prices, discounts, totals and pages.
+    """
+    changes = {'added': [], 'removed': [], 'price': [], 'discount': [], 'total': [], 'moved': []}
+    for key, (unique_id, price, sale_price, discount, total) in current.items():
+        old = previous.get(key)
+        if old is None:
+            changes['added'].append(key)
+            continue
+        old_unique_id, _, old_sale_price, old_discount, old_total = old
+        if old_sale_price != sale_price:
+            changes['price'].append([key, old_sale_price, sale_price])
+        if old_discount != discount:
+            changes['discount'].append([key, old_discount, discount])
+        if old_total != total:
+            changes['total'].append([key, old_total, total])
+        if old_unique_id != unique_id:
+            changes['moved'].append([key, old_unique_id, unique_id])
+    changes['removed'] = [key for key in previous if key not in current]
+    return changes
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Снимок склада {path} не прочитан, считаем все машины новыми: {e}")
+        return {}
+
+
+def save_snapshot(snapshot, path=SNAPSHOT_PATH):
+    """Writes the snapshot one car per line, so its own git diff stays readable."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lines = [
+        json.dumps(key, ensure_ascii=False) + ':' + json.dumps(value, separators=(',', ':'))
+        for key, value in sorted(snapshot.items())
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("{\n" + ",\n".join(lines) + "\n}\n")
+
+
+def format_changes(changes, current, previous):
+    """Returns the human-readable change report lines for the notification."""
+    def name(key, snapshot):
+        return f"{key.split('@')[0] or '—'} ({snapshot[key][0]})"
+
+    lines = [
+        f"Изменения склада: добавлено {len(changes['added'])}, снято {len(changes['removed'])}, "
+        f"цена {len(changes['price'])}, скидка {len(changes['discount'])}, количество {len(changes['total'])}"
+    ]
+    lines += [f"+ {name(key, current)}" for key in changes['added'][:REPORT_LIMIT]]
+    lines += [f"- {name(key, previous)}" for key in changes['removed'][:REPORT_LIMIT]]
+    lines += [f"₽ {name(key, current)}: {old} → {new}" for key, old, new in changes['price'][:REPORT_LIMIT]]
+    lines += [f"% {name(key, current)}: скидка {old} → {new}" for key, old, new in changes['discount'][:REPORT_LIMIT]]
+    lines += [f"# {name(key, current)}: {old} → {new} шт." for key, old, new in changes['total'][:REPORT_LIMIT]]
+    return lines
+
+
+def output_hashes(globs=OUTPUT_GLOBS):
+    """Returns {path: sha1} of the generated outputs, taken before the run overwrites them."""
+    hashes = {}
+    for pattern in globs:
+        for path in glob.glob(pattern, recursive=True):
+            with open(path, 'rb') as f:
+                hashes[path] = hashlib.sha1(VOLATILE_BYTES.sub(b'', f.read())).hexdigest()
+    return hashes
+
+
+def outputs_changed(before, globs=OUTPUT_GLOBS):
+    """Number of outputs added, removed or changed in bytes since `before` was taken."""
+    after = output_hashes(globs)
+    return sum(1 for path in before.keys() | after.keys() if before.get(path) != after.get(path))
+
+
+def report_changes(inventory, files_written=0, outputs_before=None, snapshot_path=SNAPSHOT_PATH, changes_path=CHANGES_PATH, output_path='output.txt'):
+    """
+    Diffs the inventory against the previous snapshot and records the result.
+
+    Writes the new snapshot and a JSON change set for the workflow, whose
+    'changed' flag replaces the git diff over generated files; a short
+    report is appended to output.txt, which the notification carries.
+
+    Args:
+        inventory (InventoryTable): The normalized cars of this run.
+        files_written (int): Pages and thumbnails whose bytes changed.
+        outputs_before (dict): output_hashes() from the start of the run.
+
+    Returns:
+        dict: The change set.
+    """
+    previous = load_snapshot(snapshot_path)
+    current = inventory_snapshot(inventory)
+    changes = diff_snapshots(previous, current)
+    inventory_changed = any(changes.values())
+    outputs_written = outputs_changed(outputs_before) if outputs_before is not None else 0
+
+    with open(changes_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'changed': inventory_changed or files_written > 0 or outputs_written > 0,
+            'files_written': files_written,
+            'outputs_written': outputs_written,
+            'changes': changes,
+        }, f, ensure_ascii=False)
+
+    if inventory_changed:
+        lines = format_changes(changes, current, previous)
+        print("\n".join(lines))
+        with open(output_path, 'a') as file:
+            file.write("\n".join(lines) + "\n")
+        save_snapshot(current, snapshot_path)
+    else:
+        print("Склад не изменился")
+
+    return changes
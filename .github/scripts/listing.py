@@ -0,0 +1,151 @@
+# listing.py
+
+import os
+import json
+import yaml
+import shutil
+import hashlib
+
+# Индекс сортировки и фильтрации для страницы /cars/
+LISTING_INDEX_PATH = 'src/data/cars-index.json'
+
+# LISTING_SHARDS=1 — писать порции карточек для ленивой подгрузки списка.
+# Страница /cars/ их пока не читает (рендерит всю коллекцию), поэтому по умолчанию выключено и в репозиторий не коммитится
+LISTING_SHARDS = os.getenv('LISTING_SHARDS', '0') == '1'
+
+# Порции карточек для ленивой подгрузки списка
+SHARDS_DIR = 'public/data/cars'
+SHARD_SIZE = 24
+
+# Поля frontmatter, которые нужны карточке в списке
+CARD_FIELDS = [
+    'mark_id', 'folder_id', 'complectation_name', 'modification_id', 'color', 'year', 'run', 'total',
+    'price', 'priceWithDiscount', 'max_discount', 'vin', 'image', 'thumbs', 'thumbs_lqip', 'thumbs_color',
+    'thumbs_sprite', 'thumbs_sprite_offsets',
+]
+
+# Превью в карточке не больше пяти, как в PreviewSlider
+CARD_THUMBS = 5
+
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def build_pages(inventory):
+    """
+    Collapses inventory rows into listing cards, one per page slug.
+
+    Returns:
+        dict: {slug: {'model', 'price', 'total'}} where price is the lowest
+        price with discount and total the sum of units, as in the page frontmatter.
+    """
+    stats = inventory.aggregate(inventory.slug)
+    models = {}
+    for slug_code, model_code in zip(inventory.slug, inventory.model):
+        models.setdefault(slug_code, inventory.models[model_code])
+
+    return {
+        inventory.slugs[code]: {
+            'model': models[code],
+            'price': page_stats['min_price'],
+            'total': page_stats['count'],
+        }
+        for code, page_stats in stats.items()
+    }
+
+
+def build_listing_index(pages):
+    """
+    Builds the listing index: slugs plus precomputed orderings and model filters.
+
+    Cars are referenced by their position in 'slugs', so the client only
+    applies a ready permutation instead of comparing DOM attributes.
+    """
+    slugs = sorted(pages)
+    ids = range(len(slugs))
+
+    def price(i):
+        return pages[slugs[i]]['price']
+
+    def model(i):
+        return pages[slugs[i]]['model'].lower()
+
+    models = {}
+    for i in ids:
+        models.setdefault(model(i), []).append(i)
+
+    return {
+        'slugs': slugs,
+        'totals': [pages[slug]['total'] for slug in slugs],
+        'orders': {
+            'price_up': sorted(ids, key=lambda i: (price(i), slugs[i])),
+            'price_down': sorted(ids, key=lambda i: (-price(i), slugs[i])),
+            'asc': sorted(ids, key=lambda i: (model(i), slugs[i])),
+        },
+        'models': models,
+        'model_totals': {name: sum(pages[slugs[i]]['total'] for i in members) for name, members in models.items()},
+    }
+
+
+def write_listing_index(index, path=LISTING_INDEX_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    print(f"Индекс списка автомобилей сохранен: {path}")
+
+
+def load_card(filename, slug):
+    """Reads the listing card fields from the frontmatter of a generated page."""
+    with open(filename, 'r', encoding='utf-8') as f:
+        data = yaml.load(f.read().split("---\n")[1], Loader=YamlLoader) or {}
+
+    card = {'slug': slug}
+    for field in CARD_FIELDS:
+        if field in data:
+            card[field] = data[field]
+    for field in ('thumbs', 'thumbs_lqip', 'thumbs_color', 'thumbs_sprite_offsets'):
+        if field in card:
+            card[field] = card[field][:CARD_THUMBS]
+    card['images_count'] = len(data.get('images') or [])
+    return card
+
+
+def write_listing_shards(index, directory, output_dir=SHARDS_DIR, shard_size=SHARD_SIZE):
+    """
+    Writes the listing as fixed-size JSON shards for every precomputed order.
+
+    Shards are stored as {output_dir}/{order}/{n}.json with a manifest.json
+    next to them, so the listing page can inline the first shard and fetch
+    the rest lazily.
+
+    Args:
+        index (dict): The listing index from build_listing_index.
+        directory (str): The folder with generated .mdx pages.
+        output_dir (str): The folder for shards and the manifest.
+        shard_size (int): Cars per shard.
+    """
+    slugs = index['slugs']
+    cards = [load_card(os.path.join(directory, f"{slug}.mdx"), slug) for slug in slugs]
+
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+
+    version = hashlib.sha1()
+    manifest = {'shard_size': shard_size, 'total_cars': len(cards), 'orders': {}}
+
+    for order, ids in sorted(index['orders'].items()):
+        os.makedirs(os.path.join(output_dir, order), exist_ok=True)
+        shards = [ids[start:start + shard_size] for start in range(0, len(ids), shard_size)]
+        for number, shard in enumerate(shards):
+            content = json.dumps([cards[i] for i in shard], ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+            version.update(content.encode('utf-8'))
+            with open(os.path.join(output_dir, order, f"{number}.json"), 'w', encoding='utf-8') as f:
+                f.write(content)
+        manifest['orders'][order] = {
+            'shards': len(shards),
+            'path': f"/{os.path.relpath(output_dir, 'public')}/{order}/{{n}}.json",
+        }
+
+    manifest['version'] = version.hexdigest()[:12]
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    print(f"Список автомобилей разбит на порции: {output_dir}")
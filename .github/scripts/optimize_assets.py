@@ -0,0 +1,155 @@
+# python3 .github/scripts/optimize_assets.py
+#
+# Готовит уменьшенные WEBP/AVIF-копии картинок моделей по цветам из model_mapping
+# и пишет манифест для карточек. Неизменившиеся исходники (по хэшу содержимого)
+# пропускаются, поэтому повторный запуск почти ничего не стоит.
+import os
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, UnidentifiedImageError, features
+from config import model_mapping
+from asset_resolver import MODELS_DIR, MODELS_URL
+
+OPTIMIZED_DIR = 'public/img/models-optimized'
+OPTIMIZED_URL = '/img/models-optimized'
+
+# {URL исходника: {hash, width, height, sources: {формат: [[URL, ширина], ...]}}}
+MANIFEST_PATH = 'src/data/model-assets.json'
+
+# Карточка в листинге — 360px, на экранах с высокой плотностью — 720px
+RENDITION_WIDTHS = (360, 720)
+RENDITION_FORMATS = ('avif', 'webp') if features.check('avif') else ('webp',)
+RENDITION_QUALITY = {'avif': 50, 'webp': 80}
+
+# Файлы без расширения тоже берем: в model_mapping имена часто без него
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.avif', '.gif', '')
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def collect_sources():
+    """Returns {source URL: file path} for the colors folders used in model_mapping."""
+    sources = {}
+    folders = sorted({model_info.get('folder') for model_info in model_mapping.values() if model_info.get('folder')})
+    for folder in folders:
+        colors_dir = os.path.join(MODELS_DIR, folder, 'colors')
+        if not os.path.isdir(colors_dir):
+            continue
+        for name in sorted(os.listdir(colors_dir)):
+            path = os.path.join(colors_dir, name)
+            if os.path.isfile(path) and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                sources[f"{MODELS_URL}/{folder}/colors/{name}"] = path
+    return sources
+
+
+def rendition_widths(width):
+    """Widths to render for a source: never upscaled, at least one."""
+    widths = [target for target in RENDITION_WIDTHS if target < width]
+    return widths + [width] if len(widths) < len(RENDITION_WIDTHS) else widths
+
+
+def optimize(job):
+    """
+    Renders the WEBP/AVIF copies of one source image. Runs in a worker process.
+
+    Returns:
+        tuple: (source URL, manifest entry or None if the file is not an image).
+    """
+    src, path, content_hash = job
+    folder = os.path.basename(os.path.dirname(os.path.dirname(path)))
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    try:
+        image = Image.open(path)
+        image.load()
+    except (UnidentifiedImageError, OSError) as e:
+        print(f"Пропущен файл, не изображение: {path} ({e})")
+        return src, None
+
+    # Прозрачность сохраняем, остальное — в RGB
+    image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    entry = {'hash': content_hash, 'width': image.width, 'height': image.height, 'sources': {}}
+
+    os.makedirs(os.path.join(OPTIMIZED_DIR, folder), exist_ok=True)
+    for width in rendition_widths(image.width):
+        height = round(image.height * width / image.width)
+        resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in RENDITION_FORMATS:
+            # Хэш в имени: браузер не покажет старую картинку из кэша
+            name = f"{stem}-{content_hash[:8]}-{width}.{fmt}"
+            tmp_path = os.path.join(OPTIMIZED_DIR, folder, f"{name}.{os.getpid()}.tmp")
+            resized.save(tmp_path, fmt.upper(), quality=RENDITION_QUALITY[fmt])
+            os.replace(tmp_path, os.path.join(OPTIMIZED_DIR, folder, name))
+            entry['sources'].setdefault(fmt, []).append([f"{OPTIMIZED_URL}/{folder}/{name}", width])
+    return src, entry
+
+
+def is_fresh(entry, content_hash):
+    """True if the manifest entry was built from the same bytes and its files are in place."""
+    if not entry or entry.get('hash') != content_hash or set(entry.get('sources', {})) != set(RENDITION_FORMATS):
+        return False
+    return all(
+        os.path.exists(os.path.join(OPTIMIZED_DIR, url[len(OPTIMIZED_URL) + 1:]))
+        for renditions in entry['sources'].values() for url, _ in renditions
+    )
+
+
+def remove_stale(manifest):
+    """Deletes renditions that no manifest entry points to."""
+    used = {url for entry in manifest.values() for renditions in entry['sources'].values() for url, _ in renditions}
+    if not os.path.isdir(OPTIMIZED_DIR):
+        return
+    for folder in os.listdir(OPTIMIZED_DIR):
+        folder_path = os.path.join(OPTIMIZED_DIR, folder)
+        for name in os.listdir(folder_path):
+            if f"{OPTIMIZED_URL}/{folder}/{name}" not in used:
+                os.remove(os.path.join(folder_path, name))
+                print(f"Удалена устаревшая копия: {folder}/{name}")
+        if not os.listdir(folder_path):
+            os.rmdir(folder_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build WEBP/AVIF renditions of the model color images.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    args = parser.parse_args()
+
+    previous = {}
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    manifest = {}
+    jobs = []
+    for src, path in collect_sources().items():
+        content_hash = file_hash(path)
+        if is_fresh(previous.get(src), content_hash):
+            manifest[src] = previous[src]
+        else:
+            jobs.append((src, path, content_hash))
+
+    unchanged = len(manifest)
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+            for src, entry in executor.map(optimize, jobs):
+                if entry is not None:
+                    manifest[src] = entry
+
+    remove_stale(manifest)
+
+    content = json.dumps(manifest, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    if not os.path.exists(MANIFEST_PATH) or json.dumps(previous, ensure_ascii=False, sort_keys=True, separators=(',', ':')) != content:
+        os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+        with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    print(f"Картинок моделей: {len(manifest)}, обработано: {len(jobs)}, без изменений: {unchanged}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# python3 .github/scripts/perf_gate.py .github/perf/baseline.json bench.json
+#
+# Сравнивает результаты bench.py с закоммиченной базой и падает (код 1), если
+# какой-то этап стал заметно медленнее, тяжелее по памяти или пишет больше файлов.
+# Разрешенный рост: допуск в процентах + шум (2 стандартных отклонения прогонов),
+# но не меньше абсолютного порога — чтобы этапы в доли секунды не «краснели» от шума.
+#
+# Обновить базу: python3 .github/scripts/perf_gate.py .github/perf/baseline.json bench.json --update
+import sys
+import json
+import shutil
+import argparse
+
+# Допустимый рост медианы относительно базы
+TOLERANCES = {'wall': 0.20, 'cpu': 0.20, 'memory': 0.15, 'files': 0.0}
+
+# Рост меньше этого не считается регрессией (секунды, КБ, файлы)
+FLOORS = {'wall': 0.05, 'cpu': 0.05, 'memory': 5120, 'files': 0}
+
+# Во сколько стандартных отклонений прогонов укладывается шум
+NOISE_SIGMAS = 2
+
+UNITS = {'wall': 'с', 'cpu': 'с', 'memory': 'МБ', 'files': ''}
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def parse_tolerances(values):
+    """Parses ['wall=0.3', ...] over the default tolerances."""
+    tolerances = dict(TOLERANCES)
+    for value in values:
+        metric, _, number = value.partition('=')
+        if metric not in tolerances or not number:
+            raise argparse.ArgumentTypeError(f"Неверный допуск: {value} (ожидается одно из {', '.join(tolerances)} =число)")
+        tolerances[metric] = float(number)
+    return tolerances
+
+
+def limit(baseline, current, metric, tolerances):
+    """The highest current median that still passes."""
+    noise = NOISE_SIGMAS * max(baseline['stdev'], current['stdev'])
+    return baseline['median'] + max(baseline['median'] * tolerances[metric] + noise, FLOORS[metric])
+
+
+def compare(baseline, current, tolerances=TOLERANCES):
+    """
+    Compares two bench.py results stage by stage.
+
+    Args:
+        baseline (dict): The committed results.
+        current (dict): The results of this change.
+        tolerances (dict): Allowed relative growth per metric.
+
+    Returns:
+        list: Rows of (stage, metric, baseline median, current median, limit, status).
+    """
+    rows = []
+    for name, metrics in baseline['stages'].items():
+        stage = current['stages'].get(name)
+        if stage is None:
+            rows.append((name, '', None, None, None, 'нет этапа'))
+            continue
+        for metric, base in metrics.items():
+            if metric not in stage or metric not in tolerances:
+                continue
+            allowed = limit(base, stage[metric], metric, tolerances)
+            status = 'РЕГРЕССИЯ' if stage[metric]['median'] > allowed else 'ok'
+            rows.append((name, metric, base['median'], stage[metric]['median'], allowed, status))
+    for name in current['stages']:
+        if name not in baseline['stages']:
+            rows.append((name, '', None, None, None, 'новый этап'))
+    return rows
+
+
+def format_value(value, metric):
+    if value is None:
+        return '—'
+    if metric == 'memory':
+        return f"{value / 1024:.1f} {UNITS[metric]}"
+    if metric == 'files':
+        return f"{value:g}"
+    return f"{value:.3f} {UNITS[metric]}"
+
+
+def format_table(rows):
+    header = ('Этап', 'Метрика', 'База', 'Сейчас', 'Изменение', 'Предел', 'Итог')
+    lines = [header]
+    for name, metric, base, value, allowed, status in rows:
+        change = f"{(value - base) / base * 100:+.1f}%" if base and value is not None else '—'
+        lines.append((name, metric, format_value(base, metric), format_value(value, metric), change, format_value(allowed, metric), status))
+    widths = [max(len(line[column]) for line in lines) for column in range(len(header))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail if a pipeline stage regressed against the baseline benchmark.')
+    parser.add_argument('baseline', help='Committed bench.py results')
+    parser.add_argument('results', help='bench.py results of this change')
+    parser.add_argument('--tolerance', action='append', default=[], metavar='METRIC=FRACTION', help='Override a tolerance, e.g. wall=0.3')
+    parser.add_argument('--update', action='store_true', help='Replace the baseline with the results')
+    args = parser.parse_args()
+
+    if args.update:
+        shutil.copyfile(args.results, args.baseline)
+        print(f"База обновлена: {args.baseline}")
+        return
+
+    try:
+        tolerances = parse_tolerances(args.tolerance)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    baseline = load_results(args.baseline)
+    current = load_results(args.results)
+    if baseline.get('meta', {}).get('cars') != current.get('meta', {}).get('cars'):
+        print(f"Внимание: размер фида отличается от базы ({baseline.get('meta')} и {current.get('meta')})")
+
+    rows = compare(baseline, current, tolerances)
+    print(format_table(rows))
+
+    regressions = [row for row in rows if row[5] == 'РЕГРЕССИЯ']
+    if regressions:
+        print(f"Регрессий: {len(regressions)}")
+        sys.exit(1)
+    print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
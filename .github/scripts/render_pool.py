@@ -0,0 +1,74 @@
+# render_pool.py
+
+import os
+import heapq
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# RENDER_WORKERS=N — рендерить страницы в N процессах; 0 — по числу ядер, 1 — последовательно
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS') or 1) or os.cpu_count()
+
+# Шардов больше, чем процессов: крупная страница не оставляет остальные ядра без работы
+SHARDS_PER_WORKER = 4
+
+
+def parallel_workers(workers=RENDER_WORKERS):
+    """
+    Number of render processes to use, or 1 where processes cannot be started.
+
+    Processes are forked from the generator, so the workers share the parsed
+    and normalized feed without serializing it. Daemon processes (a site run
+    by run_sites.py) cannot have children and render serially.
+    """
+    if workers <= 1:
+        return 1
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        print("Параллельный рендер недоступен без fork, страницы рендерятся последовательно")
+        return 1
+    if multiprocessing.current_process().daemon:
+        print("Параллельный рендер недоступен в процессе-демоне, страницы рендерятся последовательно")
+        return 1
+    return workers
+
+
+def partition_units(units, count):
+    """
+    Splits units of work into shards so that all units of a page land in one shard.
+
+    Pages are placed largest first into the lightest shard, and every shard
+    keeps its units in feed order, so merging a page's cars happens in the
+    same order as in a serial run.
+
+    Args:
+        units (list): (index, unique_id) pairs in feed order.
+        count (int): The number of shards.
+
+    Returns:
+        list: Non-empty lists of (index, unique_id) pairs.
+    """
+    pages = {}
+    for unit in units:
+        pages.setdefault(unit[1], []).append(unit)
+
+    shards = [[] for _ in range(max(1, count))]
+    heap = [(0, number) for number in range(len(shards))]
+    for page_units in sorted(pages.values(), key=len, reverse=True):
+        size, number = heapq.heappop(heap)
+        shards[number].extend(page_units)
+        heapq.heappush(heap, (size + len(page_units), number))
+
+    return [sorted(shard) for shard in shards if shard]
+
+
+def render_shards(render_shard, shards, workers):
+    """
+    Runs `render_shard` for every shard in forked worker processes.
+
+    Yields:
+        The results of the shards as they complete.
+    """
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=context) as executor:
+        futures = [executor.submit(render_shard, shard) for shard in shards]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,129 @@
+# python3 .github/scripts/run_sites.py --profiles sites.yml
+#
+# Обновляет несколько сайтов за один запуск: общие фиды скачиваются один раз,
+# превью и размеры изображений берутся из общего кэша, сайты обрабатываются
+# параллельно на всех ядрах.
+#
+# Пример sites.yml:
+#
+# cache_dir: /tmp/cars-cache
+# sites:
+#   - name: geely-orenburg
+#     root: ../geely-orenburg             # корень репозитория сайта
+#     repo_name: geely-orenburg.ru
+#     xml_url: https://example.com/feed.xml
+#     script: update_cars.py              # необязательно, вариант обработчика фида
+#     export_formats: cars,avito          # необязательно
+#     dealer: {city: Оренбург, where: Оренбурге}   # необязательно, иначе config.py сайта
+#     model_mapping: {...}                # необязательно, иначе config.py сайта
+import os
+import sys
+import time
+import types
+import runpy
+import argparse
+import importlib.util
+import multiprocessing
+import yaml
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_site_config(profile):
+    """Builds the 'config' module for a site from its profile or its own config.py."""
+    config = types.ModuleType('config')
+    config_path = profile.get('config', os.path.join(profile['root'], '.github', 'scripts', 'config.py'))
+    if os.path.exists(config_path):
+        spec = importlib.util.spec_from_file_location('config', config_path)
+        spec.loader.exec_module(config)
+
+    if 'dealer' in profile:
+        config.dealer = profile['dealer']
+    if 'model_mapping' in profile:
+        config.model_mapping = profile['model_mapping']
+
+    if not hasattr(config, 'dealer') or not hasattr(config, 'model_mapping'):
+        raise ValueError(f"Для сайта {profile['name']} не найдены dealer и model_mapping")
+    return config
+
+
+def run_site(job):
+    """Runs the page generator for one site in the current (fresh) worker process."""
+    profile, feed_path, cache_dir = job
+    started = time.time()
+    log_path = os.path.join(profile['root'], 'update_cars.log')
+
+    try:
+        os.chdir(profile['root'])
+        os.environ['REPO_NAME'] = profile.get('repo_name', profile['name'])
+        os.environ['XML_FILE'] = feed_path
+        os.environ['CACHE_DIR'] = cache_dir
+        os.environ['THUMBS_CACHE_DIR'] = os.path.join(cache_dir, 'thumbs')
+        if profile.get('export_formats'):
+            os.environ['EXPORT_FORMATS'] = profile['export_formats']
+
+        sys.modules['config'] = load_site_config(profile)
+        sys.path.insert(0, SCRIPTS_DIR)
+
+        with open(log_path, 'w', encoding='utf-8') as log:
+            sys.stdout = log
+            try:
+                runpy.run_path(os.path.join(SCRIPTS_DIR, profile.get('script', 'update_cars.py')), run_name='__main__')
+            finally:
+                sys.stdout = sys.__stdout__
+
+        return profile['name'], None, time.time() - started
+    except BaseException as e:
+        return profile['name'], f"{type(e).__name__}: {e}", time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update cars for several sites in one run.')
+    parser.add_argument('--profiles', default='sites.yml', help='YAML file with site profiles')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of sites processed in parallel')
+    parser.add_argument('--only', nargs='*', help='Process only the listed site names')
+    args = parser.parse_args()
+
+    with open(args.profiles, 'r', encoding='utf-8') as f:
+        settings = yaml.safe_load(f)
+
+    profiles_dir = os.path.dirname(os.path.abspath(args.profiles))
+    cache_dir = os.path.abspath(os.path.join(profiles_dir, settings.get('cache_dir', '.cache')))
+    os.environ['CACHE_DIR'] = cache_dir
+    os.environ['THUMBS_CACHE_DIR'] = os.path.join(cache_dir, 'thumbs')
+
+    profiles = settings.get('sites', [])
+    if args.only:
+        profiles = [profile for profile in profiles if profile['name'] in args.only]
+    for profile in profiles:
+        profile['root'] = os.path.abspath(os.path.join(profiles_dir, profile['root']))
+
+    # Каждый фид скачивается один раз, сколько бы сайтов его ни использовали
+    sys.path.insert(0, SCRIPTS_DIR)
+    from http_cache import fetch_cached
+
+    feeds = {}
+    for url in dict.fromkeys(profile['xml_url'] for profile in profiles):
+        feeds[url], changed = fetch_cached(url)
+        print(f"Фид {'обновлен' if changed else 'не изменился'}: {url}")
+
+    jobs = [(profile, feeds[profile['xml_url']], cache_dir) for profile in profiles]
+
+    # maxtasksperchild=1: каждый сайт в чистом процессе, без глобального состояния предыдущего
+    with multiprocessing.Pool(processes=max(1, min(args.workers, len(jobs))), maxtasksperchild=1) as pool:
+        results = pool.map(run_site, jobs, chunksize=1)
+
+    failed = 0
+    for name, error, seconds in results:
+        if error:
+            failed += 1
+            print(f"{name}: ошибка за {seconds:.1f} с — {error}")
+        else:
+            print(f"{name}: готово за {seconds:.1f} с")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# slugs.py
+
+import os
+from functools import lru_cache
+
+# SLUG_TRANSLIT=1 — кириллица в адресах страниц латиницей.
+# Меняет адреса всех страниц с кириллицей, поэтому по умолчанию выключено
+SLUG_TRANSLIT = os.getenv('SLUG_TRANSLIT', '0') == '1'
+
+# Символы, которые выбрасываются из адреса
+REMOVED_CHARS = '/\\?%*:|"<>.,;\'[]()&'
+
+# Транслитерация по упрощенной схеме (х — kh, ц — ts, ъ и ь выбрасываются).
+# Сайт берет адрес из имени файла страницы, поэтому таблица есть только здесь
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+}
+
+
+@lru_cache(maxsize=None)
+def slug_table(replace, translit):
+    """The str.translate table for one space replacement and transliteration mode."""
+    table = {ord(char): None for char in REMOVED_CHARS}
+    table[ord('+')] = '-plus'
+    table[ord(' ')] = replace
+    if translit:
+        for char, latin in TRANSLIT.items():
+            table[ord(char)] = latin
+            table[ord(char.upper())] = latin
+    return table
+
+
+@lru_cache(maxsize=None)
+def slugify(text, replace='-', translit=SLUG_TRANSLIT):
+    """
+    Turns the joined car fields into a page slug in one translate pass.
+
+    Without transliteration the result is the same as the old regex and
+    replace chain, so existing page addresses do not change.
+
+    Args:
+        text (str): The source key, e.g. "Geely Coolray 1.5 AMT Luxury Белый 2024".
+        replace (str): What spaces become.
+        translit (bool): Transliterate Cyrillic to Latin.
+
+    Returns:
+        str: The slug.
+
+    >>> slugify('Geely Coolray 1.5 AMT (150 л.с.) Luxury+ Белый 2024', translit=False)
+    'geely-coolray-15-amt-150-лс-luxury-plus-белый-2024'
+    >>> slugify('Tank 300, I Черный/черный 2024', translit=True)
+    'tank-300-i-chernyychernyy-2024'
+    >>> slugify('Съемный Щит Хэтчбек', translit=True)
+    'semnyy-shchit-khetchbek'
+    """
+    return text.translate(slug_table(replace, translit)).lower()
+
+
+class SlugIndex:
+    """
+    Index of page slugs and the source keys that produced them.
+
+    Cars with the same source key are the same configuration and share a page
+    on purpose; different source keys that end up with one slug (e.g. "1.5"
+    and "15", or a stray comma) are merged by accident and are reported.
+    """
+
+    def __init__(self):
+        self.sources = {}
+
+    def add(self, slug, source):
+        self.sources.setdefault(slug, {}).setdefault(source, 0)
+        self.sources[slug][source] += 1
+
+    def collisions(self):
+        """Returns {slug: {source key: number of cars}} for slugs with several source keys."""
+        return {slug: sources for slug, sources in self.sources.items() if len(sources) > 1}
+
+    def report(self, output_path='output.txt'):
+        """
+        Writes one line per accidental collision to output.txt.
+
+        Returns:
+            bool: True if any collisions were found.
+        """
+        collisions = self.collisions()
+        if not collisions:
+            return False
+
+        lines = []
+        for slug, sources in sorted(collisions.items()):
+            keys = ', '.join(f'"{source}" ({count})' for source, count in sorted(sources.items()))
+            lines.append(f"Разные машины на одной странице {slug}: {keys}")
+        print("\n".join(lines))
+        with open(output_path, 'a') as file:
+            file.write("\n".join(lines) + "\n")
+        return True
+
+
+# Общий индекс адресов страниц за запуск
+slug_index = SlugIndex()
@@ -0,0 +1,171 @@
+# stages.py
+
+import os
+import sys
+import json
+import time
+import resource
+import tracemalloc
+from contextlib import contextmanager
+from file_writer import file_writer
+
+# STAGES_REPORT=path.json — записать замеры этапов (для bench.py и perf_gate.py)
+STAGES_REPORT = os.getenv('STAGES_REPORT')
+
+# MEMORY_PROFILE=1 — на границе каждого этапа снимок tracemalloc и RSS с главными местами выделения
+MEMORY_PROFILE = os.getenv('MEMORY_PROFILE', '0') == '1'
+
+# Сколько мест выделения памяти показывать на этапе
+MEMORY_TOP = 10
+
+# MEMORY_BUDGET_MB=512 — упасть, если пиковый RSS главного или любого дочернего процесса больше
+MEMORY_BUDGET_MB = float(os.getenv('MEMORY_BUDGET_MB') or 0)
+
+# Служебные выделения самого профилировщика и импорта в отчет не берем
+MEMORY_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+# Импортируется раньше utils, поэтому разбор фида уже отслеживается
+if MEMORY_PROFILE:
+    tracemalloc.start()
+
+started = time.perf_counter()
+started_cpu = time.process_time()
+stages = []
+last_snapshot = None
+
+
+def peak_rss_kb():
+    """
+    Peak resident set size of the run so far, in KB.
+
+    The larger of the main process and its largest finished child process
+    (forked render workers, site workers of run_sites.py). The two are not
+    added up: forked workers share copy-on-write pages with the parent, and
+    the sum would count that memory twice.
+    """
+    return max(own_rss_kb(), children_rss_kb())
+
+
+def own_rss_kb():
+    """Peak resident set size of the main process, in KB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def children_rss_kb():
+    """Peak resident set size of the largest finished child process, in KB."""
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+def current_rss_kb():
+    """Current resident set size in KB, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * resource.getpagesize() // 1024
+
+
+def memory_profile(name):
+    """
+    Takes a tracemalloc snapshot at a stage boundary.
+
+    Only Python allocations are traced; pixel buffers of PIL images live
+    outside of them and show up in the RSS readings only.
+
+    Returns:
+        dict: Current RSS, traced memory now and at its peak during the stage
+        (KB), and the top allocation sites with their growth since the
+        previous boundary.
+    """
+    global last_snapshot
+    snapshot = tracemalloc.take_snapshot().filter_traces(MEMORY_FILTERS)
+    if last_snapshot is None:
+        statistics = snapshot.statistics('lineno')
+        top = [[str(stat.traceback[0]), stat.size // 1024, stat.size // 1024, stat.count] for stat in statistics[:MEMORY_TOP]]
+    else:
+        statistics = sorted(snapshot.compare_to(last_snapshot, 'lineno'), key=lambda stat: stat.size, reverse=True)
+        top = [[str(stat.traceback[0]), stat.size // 1024, stat.size_diff // 1024, stat.count] for stat in statistics[:MEMORY_TOP]]
+    last_snapshot = snapshot
+
+    traced, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    profile = {'rss': current_rss_kb(), 'traced': traced // 1024, 'traced_peak': traced_peak // 1024, 'top': top}
+
+    rss = f"{profile['rss'] // 1024} МБ" if profile['rss'] is not None else '—'
+    print(f"Память после этапа {name}: RSS {rss}, Python {profile['traced'] // 1024} МБ (пик {profile['traced_peak'] // 1024} МБ)")
+    for site, size, growth, count in top:
+        print(f"  {size:>8} КБ  {growth:+8} КБ  {count:>8}  {site}")
+    return profile
+
+
+def measurement(name, wall, cpu, files):
+    entry = {
+        'name': name,
+        'wall': time.perf_counter() - wall,
+        'cpu': time.process_time() - cpu,
+        'memory': peak_rss_kb(),
+        'files': file_writer.written() - files,
+    }
+    if MEMORY_PROFILE:
+        entry['memory_profile'] = memory_profile(name)
+    return entry
+
+
+@contextmanager
+def stage(name):
+    """
+    Measures a pipeline stage: wall and CPU time, peak memory and files written.
+
+    The time before the first stage (imports and parsing the feed in utils.py)
+    is recorded as 'startup'.
+    """
+    if not stages:
+        stages.append(measurement('startup', started, started_cpu, 0))
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    files = file_writer.written()
+    try:
+        yield
+    finally:
+        stages.append(measurement(name, wall, cpu, files))
+    # Бюджет проверяем после каждого этапа, чтобы не доделывать запуск, который уже вышел за него
+    check_memory_budget(stage_name=name)
+
+
+def write_stage_report(path=STAGES_REPORT):
+    """Writes the stage measurements as JSON, if a report path is set."""
+    if not path:
+        return
+    total = measurement('total', started, started_cpu, 0)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'stages': stages + [total]}, f, ensure_ascii=False, indent=2)
+
+
+def check_memory_budget(budget_mb=MEMORY_BUDGET_MB, stage_name=None):
+    """
+    Exits with an error if the main process or any child process went over the budget.
+
+    Args:
+        budget_mb (float): The budget; 0 disables the check.
+        stage_name (str): The stage that just finished; without it the peak
+            is also printed when it is within the budget (end of the run).
+    """
+    if not budget_mb:
+        return
+    # Каждый процесс со своим пиком: общие с родителем страницы дочерних процессов не складываем
+    own_mb = own_rss_kb() / 1024
+    children_mb = children_rss_kb() / 1024
+    if own_mb > budget_mb or children_mb > budget_mb:
+        where = f" после этапа {stage_name}" if stage_name else ''
+        print(f"Превышен бюджет памяти{where}: пик RSS процесса {own_mb:.0f} МБ, "
+              f"дочернего процесса {children_mb:.0f} МБ при бюджете {budget_mb:.0f} МБ")
+        sys.exit(1)
+    if stage_name is None:
+        print(f"Пик RSS процесса {own_mb:.0f} МБ, дочернего процесса {children_mb:.0f} МБ, бюджет {budget_mb:.0f} МБ")
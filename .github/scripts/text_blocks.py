@@ -0,0 +1,80 @@
+# text_blocks.py
+
+import os
+import hashlib
+from html import escape
+from cache import load_json_cache, save_json_cache
+
+# ESCAPE_TEXT=1 — экранировать HTML (& < >) и фигурные скобки MDX в описаниях и комплектации.
+# Меняет страницы, где в фиде есть такие символы, поэтому по умолчанию выключено
+ESCAPE_TEXT = os.getenv('ESCAPE_TEXT', '0') == '1'
+
+# Готовые блоки по хэшу исходного текста: {sha1: блок}
+BLOCKS_CACHE_NAME = 'text_blocks.json'
+
+# В MDX фигурные скобки — выражения JSX
+MDX_ESCAPES = str.maketrans({'{': '&#123;', '}': '&#125;'})
+
+blocks_cache = None
+
+
+def get_blocks_cache():
+    global blocks_cache
+    if blocks_cache is None:
+        blocks_cache = load_json_cache(BLOCKS_CACHE_NAME)
+    return blocks_cache
+
+
+def save_blocks_cache():
+    if blocks_cache is not None:
+        # Кэш может быть общим для нескольких сайтов: дописываем к тому, что уже на диске
+        cache = load_json_cache(BLOCKS_CACHE_NAME)
+        cache.update(blocks_cache)
+        save_json_cache(BLOCKS_CACHE_NAME, cache)
+
+
+def escape_text(text):
+    """Escapes text for the HTML body of an MDX page."""
+    return escape(text, quote=False).translate(MDX_ESCAPES)
+
+
+def cached_block(kind, text, render):
+    """
+    Returns the rendered block for a text, rendering it only once per distinct text.
+
+    Args:
+        kind (str): What the block is (e.g. "description"); part of the key.
+        text (str): The source text from the feed.
+        render (callable): Builds the block from the text.
+    """
+    cache = get_blocks_cache()
+    key = hashlib.sha1(f"{kind}\0{int(ESCAPE_TEXT)}\0{text}".encode('utf-8')).hexdigest()
+    block = cache.get(key)
+    if block is None:
+        block = cache[key] = render(text)
+    return block
+
+
+def render_description(text):
+    lines = escape_text(text).split('\n') if ESCAPE_TEXT else text.split('\n')
+    return '\n'.join("<p>&nbsp;</p>" if line.strip() == '' else f"<p>{line}</p>" for line in lines)
+
+
+def description_html(text):
+    """The page body for a description: one <p> per line, empty lines as &nbsp;."""
+    return cached_block('description', text, render_description)
+
+
+def extras_block(tag, text):
+    """
+    The frontmatter block for multi-line equipment text.
+
+    Returns:
+        str: `tag: |` followed by the indented lines, each line break kept as <br>.
+    """
+    def render(text):
+        if ESCAPE_TEXT:
+            text = escape_text(text)
+        return f"{tag}: |\n" + ''.join(f"  {line}\n" for line in text.replace('\n', '<br>\n').split("\n"))
+
+    return cached_block(f"block:{tag}", text, render)
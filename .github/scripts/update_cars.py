@@ -2,10 +2,28 @@
 import os
 import yaml
 import shutil
+import hashlib
 from PIL import Image, ImageOps
 from io import BytesIO
 from config import dealer, model_mapping
+# Раньше utils: его импорт разбирает фид и попадает в замер 'startup'
+from stages import stage, write_stage_report, check_memory_budget
 from utils import *
+from asset_resolver import ColorResolver
+from slugs import slug_index
+from feed_schema import FeedValidator
+from image_fetcher import image_fetcher
+from file_writer import file_writer, finished
+from canonical import CANONICAL_OUTPUT, canonicalize_page, dump_frontmatter, sort_cars
+from image_probe import probe_images, get_probe_cache, save_probe_cache
+from image_hash import IMAGE_DEDUP, dedupe_images, get_hash_cache, save_hash_cache
+from text_blocks import extras_block, get_blocks_cache, save_blocks_cache
+from exporters import export_feeds, get_exporters
+from inventory import InventoryTable, write_summary
+from inventory_diff import report_changes, output_hashes
+from listing import build_pages, build_listing_index, write_listing_index, write_listing_shards, LISTING_SHARDS
+from checkpoint import Checkpoint, STAGING_DIR, restore_directory
+from render_pool import parallel_workers, partition_units, render_shards, SHARDS_PER_WORKER
 import xml.etree.ElementTree as ET
 
 
@@ -18,22 +36,11 @@ def create_file(car, filename, unique_id):
 
     model_obj = model_mapping.get(model, '../404.jpg?')
 
-    # Проверяем, существует ли 'model' в 'model_mapping' и есть ли соответствующий 'color'
-    if model in model_mapping and color in model_mapping[model].get('color', {}):
-        folder = model_mapping[model]['folder']
-        color_image = model_mapping[model]['color'][color]
-        thumb = f"/img/models/{folder}/colors/{color_image}"
-    else:
-        print("")
-        errorText = f"VIN: {vin}. Не хватает модели: {model} или цвета: {color}"
-        print(errorText)
-        print("")
-        with open('output.txt', 'a') as file:
-            file.write(f"{errorText}\n")
+    # Картинка цвета из индекса; пропуски попадают в output.txt один раз в конце запуска
+    thumb = color_resolver.resolve(model, color)
+    if thumb is None:
         # Если 'model' или 'color' не найдены, используем путь к изображению ошибки 404
         thumb = "/img/404.jpg"
-        global error_404_found
-        error_404_found = True
 
     # Forming the YAML frontmatter
     content = "---\n"
@@ -71,18 +78,25 @@ def create_file(car, filename, unique_id):
             continue
         if child.tag == 'images':
             images = [img.text for img in child.findall('image')]
+            if IMAGE_DEDUP:
+                images = dedupe_images(images)
             thumbs_files = createThumbs(images, unique_id)
             content += f"images: {images}\n"
+            content += f"images_meta: {probe_images(images)}\n"
             content += f"thumbs: {thumbs_files}\n"
+            thumbs_lqip, thumbs_color = get_thumbs_placeholders(thumbs_files)
+            content += f"thumbs_lqip: {thumbs_lqip}\n"
+            content += f"thumbs_color: {thumbs_color}\n"
+            if THUMB_SPRITES:
+                thumbs_sprite, sprite_offsets = plan_thumbs_sprite(thumbs_files, unique_id)
+                if thumbs_sprite:
+                    content += f"thumbs_sprite: {thumbs_sprite}\n"
+                    content += f"thumbs_sprite_offsets: {sprite_offsets}\n"
         elif child.tag == 'color':
             content += f"{child.tag}: {color}\n"
             content += f"image: {thumb}\n"
         elif child.tag == 'extras' and child.text:
-            extras = child.text
-            flat_extras = extras.replace('\n', '<br>\n')
-            content += f"{child.tag}: |\n"
-            for line in flat_extras.split("\n"):
-                content += f"  {line}\n"
+            content += extras_block(child.tag, child.text)
         elif child.tag == 'description' and child.text:
             description = child.text
             flat_description = description.replace('\n', '<br>\n')
@@ -101,8 +115,10 @@ def create_file(car, filename, unique_id):
     content += "---\n"
     content += process_description(description)
 
-    with open(filename, 'w') as f:
-        f.write(content)
+    if CANONICAL_OUTPUT:
+        content = canonicalize_page(content)
+
+    file_writer.write(filename, content)
 
     print(filename);
     existing_files.add(filename)
@@ -110,8 +126,7 @@ def create_file(car, filename, unique_id):
 
 def update_yaml(car, filename, unique_id):
 
-    with open(filename, "r", encoding="utf-8") as f:
-        content = f.read()
+    content = file_writer.read_text(filename)
 
     # Split the content by the YAML delimiter
     yaml_delimiter = "---\n"
@@ -176,22 +191,37 @@ def update_yaml(car, filename, unique_id):
     images_container = car.find('images')
     if images_container is not None:
         images = [img.text for img in images_container.findall('image')]
+        if IMAGE_DEDUP:
+            # Одинаковые фото от разных машин страницы не копятся в галерее
+            images = dedupe_images(images, data.get('images', []))
         if len(images) > 0:
             data.setdefault('images', []).extend(images)
+            data.setdefault('images_meta', []).extend(probe_images(images))
             # Проверяем, нужно ли добавлять эскизы
             if 'thumbs' not in data or (len(data['thumbs']) < 5):
                 thumbs_files = createThumbs(images, unique_id)  # Убедитесь, что эта функция реализована
                 data.setdefault('thumbs', []).extend(thumbs_files)
+                thumbs_lqip, thumbs_color = get_thumbs_placeholders(thumbs_files)
+                data.setdefault('thumbs_lqip', []).extend(thumbs_lqip)
+                data.setdefault('thumbs_color', []).extend(thumbs_color)
+                if THUMB_SPRITES:
+                    # Полоса строится по первым превью всей страницы, сама картинка — один раз перед flush
+                    thumbs_sprite, sprite_offsets = plan_thumbs_sprite(data['thumbs'], unique_id)
+                    if thumbs_sprite:
+                        data['thumbs_sprite'] = thumbs_sprite
+                        data['thumbs_sprite_offsets'] = sprite_offsets
 
     # Convert the data back to a YAML string
-    updated_yaml_block = yaml.safe_dump(data, default_flow_style=False, allow_unicode=True)
+    if CANONICAL_OUTPUT:
+        updated_yaml_block = dump_frontmatter(data)
+    else:
+        updated_yaml_block = yaml.safe_dump(data, default_flow_style=False, allow_unicode=True)
 
     # Reassemble the content with the updated YAML block
     updated_content = yaml_delimiter.join([parts[0], updated_yaml_block, yaml_delimiter.join(parts[2:])])
 
     # Save the updated content to the output file
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(updated_content)
+    file_writer.write(filename, updated_content)
 
     return filename
 
@@ -199,52 +229,272 @@ def update_yaml(car, filename, unique_id):
 # Переменная для отслеживания наличия 404 ошибки
 error_404_found = False
 
-# Создание директории для автомобилей
-directory = "src/content/cars"
-if os.path.exists(directory):
-    shutil.rmtree(directory)
-os.makedirs(directory)
+# Индекс картинок моделей по цветам, папки сканируются один раз
+color_resolver = ColorResolver(model_mapping)
+
+# Директория для автомобилей
+content_directory = "src/content/cars"
+
+# Куда сейчас пишутся страницы: во время пакетного запуска — в staging
+directory = content_directory
 
 # для сохранения имен созданных или обновленных файлов
 existing_files = set()
 
-with open('output.txt', 'w') as file:
-    file.write("")
-
 # Предполагаем, что у вас есть элементы с именами
 elements_to_localize = []
 
-for car in root.find('cars'):
 
+def normalize_car(car):
+    """Adds the computed prices and the page URL to a car and returns its page id."""
     price = int(car.find('price').text or 0)
     max_discount = int(car.find('max_discount').text or 0)
     create_child_element(car, 'priceWithDiscount', price - max_discount)
     create_child_element(car, 'sale_price', price - max_discount)
-    unique_id = f"{build_unique_id(car, 'mark_id', 'folder_id', 'modification_id', 'complectation_name', 'color', 'year')}"
-    unique_id = f"{process_unique_id(unique_id)}"
+    source_key = build_unique_id(car, 'mark_id', 'folder_id', 'modification_id', 'complectation_name', 'color', 'year')
+    unique_id = process_unique_id(source_key)
+    # Разные машины с одним адресом сливаются в одну страницу — такие случаи попадут в отчет
+    slug_index.add(unique_id, source_key)
     print(f"Уникальный идентификатор: {unique_id}")
     create_child_element(car, 'url', f"https://{repo_name}/cars/{unique_id}/")
+    return unique_id
+
+
+def render_car(car, unique_id):
+    """Creates the car page or merges the car into an existing page with the same id."""
     file_name = f"{unique_id}.mdx"
     file_path = os.path.join(directory, file_name)
 
-    if os.path.exists(file_path):
+    if file_writer.exists(file_path):
         update_yaml(car, file_path, unique_id)
     else:
         create_file(car, file_path, unique_id)
 
-output_path = './public/cars.xml'
-convert_to_string(root)
-tree.write(output_path, encoding='utf-8', xml_declaration=True)
 
-# Удаление неиспользуемых превьюшек
-cleanup_unused_thumbs()
+def render_shard(job):
+    """
+    Renders a shard of cars in a worker process.
+
+    Args:
+        job (tuple): The shard's own folder, the staging folder and the
+            (index, unique_id) units to render.
+
+    Runs in a process forked after normalization, so `root` already holds the
+    normalized cars. Pages go to the shard's own folder, seeded with the pages
+    already staged by a resumed run; the main process moves them into staging
+    when it journals the shard, so a shard that dies halfway leaves no pages
+    of unjournaled cars behind.
+
+    Returns:
+        dict: The shard folder, the rendered units with their thumbnails, the
+        thumbnail strips, the files whose bytes changed and the new cache entries, for the main
+        process to merge.
+    """
+    global directory
+    shard_directory, staged_directory, units = job
+
+    # Процесс рендерит несколько шардов подряд: папку и учет записей шарда возвращаем после него
+    saved_directory, saved_changed, saved_mirrors = directory, file_writer.changed, file_writer.mirrors
+    saved_sprites = dict(sprite_pages)
+    sprite_pages.clear()
+    directory = shard_directory
+    file_writer.changed = {}
+    file_writer.mirrors = list(saved_mirrors)
+    file_writer.mirror(directory, content_directory)
+    try:
+        os.makedirs(directory)
+        for file_name in dict.fromkeys(f"{unique_id}.mdx" for _, unique_id in units):
+            staged_path = os.path.join(staged_directory, file_name)
+            if os.path.exists(staged_path):
+                shutil.copy2(staged_path, os.path.join(directory, file_name))
+
+        cars = list(root.find('cars'))
+        rendered = []
+        for index, unique_id in units:
+            thumbs_count = len(current_thumbs)
+            render_car(cars[index], unique_id)
+            rendered.append((index, unique_id, current_thumbs[thumbs_count:]))
+        # Все машины страницы в этом шарде: полосы превью собираем здесь же, параллельно
+        sprites_count = len(current_thumbs)
+        write_thumbs_sprites(directory)
+        file_writer.flush()
+        image_fetcher.report()
+        return {
+            'directory': shard_directory,
+            'units': rendered,
+            'sprites': current_thumbs[sprites_count:],
+            'changed': file_writer.changed,
+            'probe_cache': get_probe_cache(),
+            'hash_cache': get_hash_cache() if IMAGE_DEDUP else None,
+            'blocks_cache': get_blocks_cache(),
+        }
+    finally:
+        directory, file_writer.changed, file_writer.mirrors = saved_directory, saved_changed, saved_mirrors
+        sprite_pages.clear()
+        sprite_pages.update(saved_sprites)
+
+
+def render_parallel(units, checkpoint, workers):
+    """Renders the cars in worker processes and merges their results in feed order."""
+    shards = partition_units(units, workers * SHARDS_PER_WORKER)
+    print(f"Параллельный рендер: машин {len(units)}, шардов {len(shards)}, процессов {workers}")
+
+    # Папки шардов прошлого, прерванного запуска не нужны: их машины не в журнале
+    shards_directory = f"{checkpoint.directory}.shards"
+    shutil.rmtree(shards_directory, ignore_errors=True)
+    jobs = [(os.path.join(shards_directory, str(number)), checkpoint.directory, shard) for number, shard in enumerate(shards)]
+
+    results = []
+    for result in render_shards(render_shard, jobs, workers):
+        # Страницы шарда целиком на диске: журналируем его машины и переносим страницы в staging
+        checkpoint.record_shard([unit + (error_404_found,) for unit in result['units']], result['directory'])
+        for file_name in checkpoint.adopt(result['directory']):
+            existing_files.add(os.path.join(directory, file_name))
+        file_writer.changed.update(result['changed'])
+        get_probe_cache().update(result['probe_cache'])
+        if IMAGE_DEDUP:
+            get_hash_cache().update(result['hash_cache'])
+        get_blocks_cache().update(result['blocks_cache'])
+        results.extend(result['units'])
+        current_thumbs.extend(result['sprites'])
+    shutil.rmtree(shards_directory, ignore_errors=True)
+
+    # Превью в том же порядке, что и при последовательном рендере
+    for _, _, thumbs in sorted(results):
+        current_thumbs.extend(thumbs)
+
+
+def write_outputs(root, cars_element, inventory):
+    """Writes the marketplace feeds and the listing data for the site."""
+    convert_to_string(root)
+    # Все выгрузки (cars.xml, avito.xml, ...) пишутся за один проход по машинам
+    export_feeds(root, cars_element, get_exporters(os.getenv('EXPORT_FORMATS', 'cars'), site_name=repo_name))
+
+    write_summary(inventory)
+    listing_index = build_listing_index(build_pages(inventory))
+    write_listing_index(listing_index)
+    if LISTING_SHARDS:
+        write_listing_shards(listing_index, directory)
+
+
+def main():
+    global directory
+    global error_404_found
+
+    # Битые машины убираются из фида до любых удалений, скачиваний и рендера
+    feed_validator = FeedValidator('cars')
+    feed_validator.validate(root.find('cars'))
+
+    # Хэши выгрузок до запуска: изменением считаются только другие байты
+    outputs_before = output_hashes()
+
+    # Если прошлый запуск упал посреди подмены папки, возвращаем старую
+    restore_directory(os.path.join(STAGING_DIR, 'cars'), content_directory)
+
+    # Машины в постоянном порядке, чтобы страницы и выгрузки не зависели от порядка в фиде
+    if CANONICAL_OUTPUT:
+        sort_cars(root.find('cars'))
+
+    # Страницы пишутся в staging, src/content/cars не трогаем до конца запуска
+    checkpoint = Checkpoint(hashlib.sha1(ET.tostring(root)).hexdigest())
+    directory = checkpoint.directory
+    # Страница, совпавшая с текущей, берется жесткой ссылкой и не меняет mtime
+    file_writer.mirror(checkpoint.directory, content_directory)
+
+    # Колоночная таблица всех машин для сводки по моделям
+    inventory = InventoryTable()
+
+    # При продолжении в output.txt уже есть ошибки обработанных машин
+    if not checkpoint.resumed:
+        with open('output.txt', 'w') as file:
+            file.write("")
+
+    # Машины, чьи файлы еще пишутся: в журнал они попадают только после записи на диск
+    unjournaled = []
+
+    # Машины для процессов рендера: все машины одной страницы попадают в один процесс
+    workers = parallel_workers()
+    parallel_units = []
+
+    with stage('render'):
+        cars = list(root.find('cars'))
+        unique_ids = []
+        for car in cars:
+            unique_id = normalize_car(car)
+            inventory.add_car(car, unique_id)
+            color_resolver.note_car(car)
+            unique_ids.append(unique_id)
+
+        # Страница могла записаться раньше, чем машина попала в журнал: такие страницы собираем заново
+        checkpoint.discard_partial(unique_ids)
+
+        for index, (car, unique_id) in enumerate(zip(cars, unique_ids)):
+            if checkpoint.done(index):
+                unit = checkpoint.units[index]
+                current_thumbs.extend(unit['thumbs'])
+                existing_files.add(os.path.join(directory, f"{unique_id}.mdx"))
+                error_404_found = error_404_found or unit['error_404']
+                if THUMB_SPRITES:
+                    # Полосу страницы из журнала собираем заново: прошлый запуск мог упасть до нее
+                    sprite_pages.setdefault(unique_id, None)
+                continue
+
+            if workers > 1:
+                parallel_units.append((index, unique_id))
+                continue
+
+            thumbs_count = len(current_thumbs)
+            writes_count = len(file_writer.futures)
+            render_car(car, unique_id)
+            unjournaled.append((index, unique_id, current_thumbs[thumbs_count:], error_404_found, file_writer.futures[writes_count:]))
+            while unjournaled and finished(unjournaled[0][4]):
+                checkpoint.record(*unjournaled.pop(0)[:4])
+
+        if parallel_units:
+            render_parallel(parallel_units, checkpoint, workers)
+
+        # Полосы превью — один раз на страницу, когда все ее машины уже слиты
+        write_thumbs_sprites(directory)
+        file_writer.flush()
+        for unit in unjournaled:
+            checkpoint.record(*unit[:4])
+
+        checkpoint.commit(content_directory)
+        directory = content_directory
+
+    with stage('outputs'):
+        write_outputs(root, root.find('cars'), inventory)
+
+    with stage('cleanup'):
+        # Удаление неиспользуемых превьюшек
+        cleanup_unused_thumbs()
+        file_writer.report()
+        image_fetcher.report()
+
+        # Что изменилось на складе с прошлого коммита — для решения о коммите и уведомления
+        report_changes(inventory, file_writer.written(), outputs_before)
+
+        # Сохранение кэша размеров изображений для следующего запуска
+        save_probe_cache()
+        save_hash_cache()
+        save_blocks_cache()
+
+    # Каждая недостающая модель/цвет — одной строкой с числом VIN
+    if color_resolver.report():
+        error_404_found = True
+
+    # Разные машины, случайно попавшие на одну страницу
+    slug_index.report()
+
+    # Машины, исключенные из фида при проверке
+    feed_validator.report()
 
+    if error_404_found:
+        print("error 404 found")
 
-for existing_file in os.listdir(directory):
-    filepath = os.path.join(directory, existing_file)
-    if filepath not in existing_files:
-        os.remove(filepath)
+    write_stage_report()
+    check_memory_budget()
 
-if error_404_found:
-    print("error 404 found")
 
+if __name__ == "__main__":
+    main()
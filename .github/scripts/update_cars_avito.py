@@ -1,37 +1,12 @@
-# python3 .github/scripts/update_cars.py
+# python3 .github/scripts/update_cars_avito.py
 import os
-import yaml
-import shutil
-import copy
-from PIL import Image, ImageOps
-from io import BytesIO
 from config import dealer, model_mapping
 from utils import *
+from exporters import AvitoExporter, export_feeds
 import xml.etree.ElementTree as ET
 
-def duplicate_car(car, n, status = "в пути", num=9):
-    """Функция для дублирования элемента 'car' N раз с изменением vin."""
-    duplicates = []
-    for i in range(n):
-        new_car = copy.deepcopy(car)  # Клонируем текущий элемент car
-        vin = new_car.find('vin').text
-
-        # Извлекаем последние 5 символов
-        vin_suffix = vin[-5:]
-        # Меняем пятую цифру с конца на 9
-        vin_suffix = num + vin_suffix[1:]
-        # Преобразуем последние 5 символов в число и уменьшаем на i
-        new_suffix = str(int(vin_suffix) - i).zfill(5)  # zfill добавляет ведущие нули, если нужно
-        # Собираем новый VIN
-        new_vin = vin[:-5] + new_suffix
-        
-        # new_vin = f"VIN_{i+1:05d}"    # Генерация уникального значения VIN (заглушка)
-        new_car.find('vin').text = new_vin  # Меняем текст VIN
-        new_car.find('availability').text = status  # Меняем статус Наличие автомобиля
-        duplicates.append(new_car)
-    
-    return duplicates
-    
+# Этот скрипт нужен, только если у Avito отдельный фид (AVITO_XML_URL).
+# Если фид общий, avito.xml пишется вместе с cars.xml: EXPORT_FORMATS=cars,avito
 
 
 # Переменная для отслеживания наличия 404 ошибки
@@ -40,11 +15,6 @@ error_404_found = False
 with open('output.txt', 'w') as file:
     file.write("")
 
-# Предполагаем, что у вас есть элементы с именами
-elements_to_localize = []
-# Предполагаем, что cars_element уже определён
-all_duplicates = []  # Список для хранения всех дубликатов
-
 cars_element = root.find('cars')
 
 for car in cars_element:
@@ -52,19 +22,10 @@ for car in cars_element:
     unique_id = f"{process_unique_id(unique_id)}"
     print(f"Уникальный идентификатор: {unique_id}")
     create_child_element(car, 'url', f"https://{repo_name}/cars/{unique_id}/")
-    # Создаем дубликаты, но не добавляем их сразу в cars_element
-    duplicates = duplicate_car(car, 5)
-    all_duplicates.extend(duplicates)  # Добавляем дубликаты в отдельный список
-
-# После окончания основного цикла добавляем все дубликаты в cars_element
-for new_car in all_duplicates:
-    cars_element.append(new_car)
 
-
-output_path = './public/avito.xml'
 convert_to_string(root)
-tree.write(output_path, encoding='utf-8', xml_declaration=True)
+# Дубликаты 'в пути' добавляются при выгрузке, без второго прохода по дереву
+export_feeds(root, cars_element, [AvitoExporter()])
 
 if error_404_found:
     print("error 404 found")
-
@@ -6,6 +6,20 @@ from PIL import Image, ImageOps
 from io import BytesIO
 from config import dealer, model_mapping
 from utils import *
+from asset_resolver import ColorResolver
+from slugs import slug_index
+from feed_schema import FeedValidator
+from image_fetcher import image_fetcher
+from file_writer import file_writer
+from canonical import CANONICAL_OUTPUT, canonicalize_page, dump_frontmatter, sort_cars
+from image_probe import probe_images, save_probe_cache
+from image_hash import IMAGE_DEDUP, dedupe_images, save_hash_cache
+from text_blocks import extras_block, save_blocks_cache
+from exporters import export_feeds, get_exporters
+from inventory import InventoryTable, write_summary
+from inventory_diff import report_changes, output_hashes
+from listing import build_pages, build_listing_index, write_listing_index, write_listing_shards, LISTING_SHARDS
+from checkpoint import STAGING_DIR, restore_directory, swap_directory
 import xml.etree.ElementTree as ET
 
 
@@ -18,22 +32,11 @@ def create_file(car, filename, unique_id):
 
     model_obj = model_mapping.get(model, '../404.jpg?')
 
-    # Проверяем, существует ли 'model' в 'model_mapping' и есть ли соответствующий 'color'
-    if model in model_mapping and color in model_mapping[model].get('color', {}):
-        folder = model_mapping[model]['folder']
-        color_image = model_mapping[model]['color'][color]
-        thumb = f"/img/models/{folder}/colors/{color_image}"
-    else:
-        print("")
-        errorText = f"VIN: {vin}. Не хватает модели: {model} или цвета: {color}"
-        print(errorText)
-        print("")
-        with open('output.txt', 'a') as file:
-            file.write(f"{errorText}\n")
+    # Картинка цвета из индекса; пропуски попадают в output.txt один раз в конце запуска
+    thumb = color_resolver.resolve(model, color)
+    if thumb is None:
         # Если 'model' или 'color' не найдены, используем путь к изображению ошибки 404
         thumb = "/img/404.jpg"
-        global error_404_found
-        error_404_found = True
 
     # Forming the YAML frontmatter
     content = "---\n"
@@ -65,18 +68,25 @@ def create_file(car, filename, unique_id):
             continue
         if child.tag == 'photos':
             images = [img.text for img in child.findall('photo')]
+            if IMAGE_DEDUP:
+                images = dedupe_images(images)
             thumbs_files = createThumbs(images, unique_id)
             content += f"images: {images}\n"
+            content += f"images_meta: {probe_images(images)}\n"
             content += f"thumbs: {thumbs_files}\n"
+            thumbs_lqip, thumbs_color = get_thumbs_placeholders(thumbs_files)
+            content += f"thumbs_lqip: {thumbs_lqip}\n"
+            content += f"thumbs_color: {thumbs_color}\n"
+            if THUMB_SPRITES:
+                thumbs_sprite, sprite_offsets = plan_thumbs_sprite(thumbs_files, unique_id)
+                if thumbs_sprite:
+                    content += f"thumbs_sprite: {thumbs_sprite}\n"
+                    content += f"thumbs_sprite_offsets: {sprite_offsets}\n"
         elif child.tag == 'color':
             content += f"{child.tag}: {color}\n"
             content += f"image: {thumb}\n"
         elif child.tag == 'extras' and child.text:
-            extras = child.text
-            flat_extras = extras.replace('\n', '<br>\n')
-            content += f"{child.tag}: |\n"
-            for line in flat_extras.split("\n"):
-                content += f"  {line}\n"
+            content += extras_block(child.tag, child.text)
         elif child.tag == 'comment' and child.text:
             description = child.text
             flat_description = description.replace('\n', '<br>\n')
@@ -101,8 +111,10 @@ def create_file(car, filename, unique_id):
     content += "---\n"
     content += process_description(description)
 
-    with open(filename, 'w') as f:
-        f.write(content)
+    if CANONICAL_OUTPUT:
+        content = canonicalize_page(content)
+
+    file_writer.write(filename, content)
 
     print(filename);
     existing_files.add(filename)
@@ -111,8 +123,7 @@ def create_file(car, filename, unique_id):
 def update_yaml(car, filename, unique_id):
     """Increment the 'total' value in the YAML block of an HTML file."""
 
-    with open(filename, "r", encoding="utf-8") as f:
-        content = f.read()
+    content = file_writer.read_text(filename)
 
     # Split the content by the YAML delimiter
     yaml_delimiter = "---\n"
@@ -167,22 +178,37 @@ def update_yaml(car, filename, unique_id):
     images_container = car.find('photos')
     if images_container is not None:
         images = [img.text for img in images_container.findall('photo')]
+        if IMAGE_DEDUP:
+            # Одинаковые фото от разных машин страницы не копятся в галерее
+            images = dedupe_images(images, data.get('images', []))
         if len(images) > 0:
             data.setdefault('images', []).extend(images)
+            data.setdefault('images_meta', []).extend(probe_images(images))
             # Проверяем, нужно ли добавлять эскизы
             if 'thumbs' not in data or (len(data['thumbs']) < 5):
                 thumbs_files = createThumbs(images, unique_id)  # Убедитесь, что эта функция реализована
                 data.setdefault('thumbs', []).extend(thumbs_files)
+                thumbs_lqip, thumbs_color = get_thumbs_placeholders(thumbs_files)
+                data.setdefault('thumbs_lqip', []).extend(thumbs_lqip)
+                data.setdefault('thumbs_color', []).extend(thumbs_color)
+                if THUMB_SPRITES:
+                    # Полоса строится по первым превью всей страницы, сама картинка — один раз перед flush
+                    thumbs_sprite, sprite_offsets = plan_thumbs_sprite(data['thumbs'], unique_id)
+                    if thumbs_sprite:
+                        data['thumbs_sprite'] = thumbs_sprite
+                        data['thumbs_sprite_offsets'] = sprite_offsets
 
     # Convert the data back to a YAML string
-    updated_yaml_block = yaml.safe_dump(data, default_flow_style=False, allow_unicode=True)
+    if CANONICAL_OUTPUT:
+        updated_yaml_block = dump_frontmatter(data)
+    else:
+        updated_yaml_block = yaml.safe_dump(data, default_flow_style=False, allow_unicode=True)
 
     # Reassemble the content with the updated YAML block
     updated_content = yaml_delimiter.join([parts[0], updated_yaml_block, yaml_delimiter.join(parts[2:])])
 
     # Save the updated content to the output file
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(updated_content)
+    file_writer.write(filename, updated_content)
 
     return filename
 
@@ -190,15 +216,33 @@ def update_yaml(car, filename, unique_id):
 # Переменная для отслеживания наличия 404 ошибки
 error_404_found = False
 
-# Создание директории для автомобилей
-directory = "src/content/cars"
+# Индекс картинок моделей по цветам, папки сканируются один раз
+color_resolver = ColorResolver(model_mapping)
+
+# Битые машины убираются из фида до удаления страниц, скачиваний и рендера
+feed_validator = FeedValidator('vehicles')
+feed_validator.validate(root.find("vehicles"))
+
+# Хэши выгрузок до запуска: изменением считаются только другие байты
+outputs_before = output_hashes()
+
+# Страницы пишутся в staging, src/content/cars подменяется только после записи всех машин
+content_directory = "src/content/cars"
+# Если прошлый запуск упал посреди подмены папки, возвращаем старую
+restore_directory(os.path.join(STAGING_DIR, 'cars'), content_directory)
+directory = os.path.join(STAGING_DIR, 'cars')
 if os.path.exists(directory):
     shutil.rmtree(directory)
 os.makedirs(directory)
+# Страница, совпавшая с текущей, берется жесткой ссылкой и не меняет mtime
+file_writer.mirror(directory, content_directory)
 
 # для сохранения имен созданных или обновленных файлов
 existing_files = set()
 
+# Колоночная таблица всех машин для сводки по моделям
+inventory = InventoryTable()
+
 with open('output.txt', 'w') as file:
     file.write("")
 
@@ -206,6 +250,10 @@ with open('output.txt', 'w') as file:
 elements_to_localize = ['engineType', 'drive_type', 'gearboxType', 'ptsType', 'color', 'body_type', 'wheel']
 # , 'bodyColor', 'bodyType', 'steeringWheel'
 
+# Машины в постоянном порядке, чтобы страницы и выгрузки не зависели от порядка в фиде
+if CANONICAL_OUTPUT:
+    sort_cars(root.find("vehicles"))
+
 for car in root.find("vehicles"):
     rename_child_element(car, 'mark', 'mark_id')
     rename_child_element(car, 'model', 'folder_id')
@@ -228,31 +276,68 @@ for car in root.find("vehicles"):
     price = int(car.find('price').text or 0)
     create_child_element(car, 'priceWithDiscount', price - max_discount)
     create_child_element(car, 'sale_price', price - max_discount)
-    unique_id = f"{build_unique_id(car, 'mark_id', 'folder_id', 'modification_id', 'complectation_name', 'color', 'year')}"
-    unique_id = f"{process_unique_id(unique_id)}"
+    source_key = build_unique_id(car, 'mark_id', 'folder_id', 'modification_id', 'complectation_name', 'color', 'year')
+    unique_id = process_unique_id(source_key)
+    # Разные машины с одним адресом сливаются в одну страницу — такие случаи попадут в отчет
+    slug_index.add(unique_id, source_key)
     print(f"Уникальный идентификатор: {unique_id}")
     create_child_element(car, 'url', f"https://{repo_name}/cars/{unique_id}/")
+    inventory.add_car(car, unique_id)
+    color_resolver.note_car(car)
     update_element_text(car, 'url_link', f"https://{repo_name}/cars/{unique_id}/")
     file_name = f"{unique_id}.mdx"
     file_path = os.path.join(directory, file_name)
 
-    if os.path.exists(file_path):
+    if file_writer.exists(file_path):
         update_yaml(car, file_path, unique_id)
     else:
         create_file(car, file_path, unique_id)
 
-output_path = './public/cars.xml'
+# Полосы превью — один раз на страницу, когда все ее машины уже слиты
+write_thumbs_sprites(directory)
+
+# Дожидаемся записи страниц и превью: дальше их читают выгрузки и очистка
+file_writer.flush()
+
+# Все страницы на диске: подменяем ими src/content/cars, машины, которых нет в фиде, уходят вместе со старой папкой
+swap_directory(directory, content_directory)
+if not os.listdir(STAGING_DIR):
+    os.rmdir(STAGING_DIR)
+directory = content_directory
+
 convert_to_string(root)
-tree.write(output_path, encoding='utf-8', xml_declaration=True)
+# Все выгрузки (cars.xml, avito.xml, ...) пишутся за один проход по машинам
+export_feeds(root, root.find("vehicles"), get_exporters(os.getenv('EXPORT_FORMATS', 'cars'), site_name=repo_name))
+
+write_summary(inventory)
+listing_index = build_listing_index(build_pages(inventory))
+write_listing_index(listing_index)
+if LISTING_SHARDS:
+    write_listing_shards(listing_index, directory)
 
 # Удаление неиспользуемых превьюшек
 cleanup_unused_thumbs()
+file_writer.report()
+image_fetcher.report()
+
+# Что изменилось на складе с прошлого коммита — для решения о коммите и уведомления
+report_changes(inventory, file_writer.written(), outputs_before)
+
+# Сохранение кэша размеров изображений для следующего запуска
+save_probe_cache()
+save_hash_cache()
+save_blocks_cache()
+
+# Каждая недостающая модель/цвет — одной строкой с числом VIN
+if color_resolver.report():
+    error_404_found = True
+
+# Разные машины, случайно попавшие на одну страницу
+slug_index.report()
 
+# Машины, исключенные из фида при проверке
+feed_validator.report()
 
-for existing_file in os.listdir(directory):
-    filepath = os.path.join(directory, existing_file)
-    if filepath not in existing_files:
-        os.remove(filepath)
 
 if error_404_found:
     print("error 404 found")
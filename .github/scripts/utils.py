@@ -1,24 +1,22 @@
 # utils.py
 
 import os
-import re
+import yaml
+import base64
 import requests
 import xml.etree.ElementTree as ET
 from PIL import Image, ImageOps
 from io import BytesIO
+from http_cache import get_cached_thumb, store_cached_thumb
+from file_writer import file_writer
+from image_fetcher import image_fetcher
+from slugs import slugify
+from text_blocks import description_html
 
 
 def process_unique_id(unique_id, replace = "-"):
-    # Удаление специальных символов
-    processed_id = re.sub(r'[\/\\?%*:|"<>.,;\'\[\]()&]', '', unique_id)
-
-    # Замена '+' на '-plus'
-    processed_id = processed_id.replace("+", "-plus")
-
-    # Удаление пробелов и приведение к нижнему регистру
-    processed_id = processed_id.replace(" ", replace).lower()
-
-    return processed_id
+    # Спецсимволы убираются, '+' становится '-plus', пробелы — replace, все в нижнем регистре (slugs.py)
+    return slugify(unique_id, replace)
 
 
 def process_vin_hidden(vin):
@@ -32,14 +30,39 @@ def process_permalink(vin):
 
 # Helper function to process description and add it to the body
 def process_description(desc_text):
-    lines = desc_text.split('\n')
-    processed_lines = []
-    for line in lines:
-        if line.strip() == '':
-            processed_lines.append("<p>&nbsp;</p>")
-        else:
-            processed_lines.append(f"<p>{line}</p>")
-    return '\n'.join(processed_lines)
+    # Одинаковые описания рендерятся один раз и берутся из кэша по хэшу текста (text_blocks.py)
+    return description_html(desc_text)
+
+
+def create_placeholder(image):
+    """
+    Builds a tiny LQIP placeholder and the dominant color of an image.
+
+    Args:
+        image (Image): The decoded PIL image.
+
+    Returns:
+        tuple: A base64 data URI of a ~20px WEBP image and a hex color string.
+    """
+    small_image = image.convert('RGB')
+    small_image.thumbnail((20, 20))
+
+    buffer = BytesIO()
+    small_image.save(buffer, "WEBP", quality=40)
+    lqip = f"data:image/webp;base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+
+    # Самый частый цвет из палитры на 4 цвета
+    quantized = small_image.quantize(colors=4)
+    _, color_index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[color_index * 3:color_index * 3 + 3]
+
+    return lqip, f"#{r:02x}{g:02x}{b:02x}"
+
+
+def get_thumbs_placeholders(thumbs_files):
+    """Returns the LQIP and dominant color lists for the given thumbnail paths."""
+    placeholders = [thumbs_placeholders.get(thumb, ("", "")) for thumb in thumbs_files]
+    return [lqip for lqip, _ in placeholders], [color for _, color in placeholders]
 
 
 def createThumbs(image_urls, unique_id):
@@ -52,6 +75,13 @@ def createThumbs(image_urls, unique_id):
     # Список для хранения путей к новым или существующим файлам
     new_or_existing_files = []
 
+    # Исходники, которых нет ни на диске, ни в общем кэше, качаем параллельно с лимитами по хостам
+    missing_urls = [
+        img_url for index, img_url in enumerate(image_urls[:5])
+        if not file_writer.exists(os.path.join(output_dir, f"thumb_{unique_id}_{index}.webp")) and not get_cached_thumb(img_url)
+    ]
+    downloads = image_fetcher.fetch_many(missing_urls)
+
     # Обработка первых 5 изображений
     for index, img_url in enumerate(image_urls[:5]):
         try:
@@ -59,20 +89,38 @@ def createThumbs(image_urls, unique_id):
             output_path = os.path.join(output_dir, output_filename)
             relative_output_path = os.path.join(relative_output_dir, output_filename)
 
+            cached_thumb = None if file_writer.exists(output_path) else get_cached_thumb(img_url)
+
             # Проверка существования файла
-            if not os.path.exists(output_path):
+            if cached_thumb:
+                # Превью этого изображения уже делал другой сайт
+                with open(cached_thumb, 'rb') as f:
+                    file_writer.write(output_path, f.read())
+            elif not file_writer.exists(output_path):
                 # Загрузка и обработка изображения, если файла нет
-                response = requests.get(img_url)
-                image = Image.open(BytesIO(response.content))
+                content = downloads[img_url]
+                if isinstance(content, Exception):
+                    # Недоступный хост не останавливает запуск: превью появится в следующий раз
+                    raise content
+                image = Image.open(BytesIO(content))
                 aspect_ratio = image.width / image.height
                 new_width = 360
                 new_height = int(new_width / aspect_ratio)
                 resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                resized_image.save(output_path, "WEBP")
+                # Сжимаем в памяти, на диск превью запишет пул file_writer
+                buffer = BytesIO()
+                resized_image.save(buffer, "WEBP")
+                file_writer.write(output_path, buffer.getvalue())
+                store_cached_thumb(img_url, buffer.getvalue())
                 print(f"Создано превью: {relative_output_path}")
             # else:
                 # print(f"Файл уже существует: {relative_output_path}")
 
+            # Плейсхолдер считаем по готовому превью, чтобы он не зависел от того, новое оно или нет
+            if relative_output_path not in thumbs_placeholders:
+                with Image.open(BytesIO(file_writer.read_bytes(output_path))) as image:
+                    thumbs_placeholders[relative_output_path] = create_placeholder(image)
+
             # Добавление относительного пути файла в списки
             new_or_existing_files.append(relative_output_path)
             current_thumbs.append(output_path)  # Здесь сохраняем полный путь для дальнейшего использования
@@ -82,6 +130,85 @@ def createThumbs(image_urls, unique_id):
     return new_or_existing_files
 
 
+def sprite_layout(thumbs_files):
+    """
+    Returns the frames of a page's strip and the x offset of every thumbnail.
+
+    A thumbnail listed twice reuses its frame.
+    """
+    frames = []
+    offsets = []
+    for thumb in thumbs_files[:5]:
+        if thumb not in frames:
+            frames.append(thumb)
+        offsets.append(frames.index(thumb) * SPRITE_FRAME[0])
+    return frames, offsets
+
+
+def plan_thumbs_sprite(thumbs_files, unique_id):
+    """
+    Returns the strip fields for the frontmatter and schedules the strip.
+
+    The strip itself is built by write_thumbs_sprites once all cars of the
+    page are merged; a later merge only replaces the scheduled thumbnails.
+
+    Args:
+        thumbs_files (list): All relative thumbnail paths of the page.
+        unique_id (str): The page slug.
+
+    Returns:
+        tuple: The relative strip path and the x offset of every thumbnail's
+        frame in pixels, or (None, []) if the page has no thumbnails.
+    """
+    frames, offsets = sprite_layout(thumbs_files)
+    if not frames:
+        sprite_pages.pop(unique_id, None)
+        return None, []
+    sprite_pages[unique_id] = list(thumbs_files)
+    return os.path.join("/img/thumbs/", f"sprite_{unique_id}.webp"), offsets
+
+
+def write_thumbs_sprites(directory):
+    """
+    Packs the preview thumbnails of every scheduled page into one horizontal strip.
+
+    Frames are cropped to SPRITE_FRAME the way the slider shows them
+    (object-cover, centered). The individual thumbnails stay on disk and in
+    the frontmatter. Called before file_writer.flush, so every strip is
+    decoded and encoded once per page, not once per merged car.
+
+    Args:
+        directory (str): The folder with the pages, for pages scheduled
+            without thumbnails (taken from a resumed run's journal).
+    """
+    for unique_id, thumbs_files in sorted(sprite_pages.items()):
+        output_filename = f"sprite_{unique_id}.webp"
+        output_path = os.path.join(output_dir, output_filename)
+        try:
+            if thumbs_files is None:
+                # Страница целиком из журнала прерванного запуска: превью берем из нее
+                content = file_writer.read_text(os.path.join(directory, f"{unique_id}.mdx"))
+                data = yaml.safe_load(content.split("---\n")[1]) or {}
+                if not data.get('thumbs_sprite'):
+                    continue
+                thumbs_files = data.get('thumbs') or []
+            frames, _ = sprite_layout(thumbs_files)
+            sprite = Image.new('RGB', (SPRITE_FRAME[0] * len(frames), SPRITE_FRAME[1]))
+            for index, thumb in enumerate(frames):
+                with Image.open(BytesIO(file_writer.read_bytes(os.path.join(output_dir, os.path.basename(thumb))))) as image:
+                    sprite.paste(ImageOps.fit(image.convert('RGB'), SPRITE_FRAME, Image.Resampling.LANCZOS), (index * SPRITE_FRAME[0], 0))
+            buffer = BytesIO()
+            sprite.save(buffer, "WEBP")
+        except Exception as e:
+            print(f"Ошибка при сборке полосы превью {output_filename}: {e}")
+            continue
+
+        # Файл с теми же байтами не перезаписывается
+        file_writer.write(output_path, buffer.getvalue())
+        current_thumbs.append(output_path)
+    sprite_pages.clear()
+
+
 def cleanup_unused_thumbs():
     global current_thumbs
     global output_dir
@@ -145,14 +272,14 @@ def build_unique_id(car, *elements):
     Returns:
         str: The unique ID string containing extracted elements (joined by spaces).
     """
-    unique_id_parts = []
-
-    for element_name in elements:
-        element = car.find(element_name)
-        if element is not None and element.text is not None:
-            unique_id_parts.append(element.text.strip())
+    # Один проход по машине вместо find на каждое поле; берется первый элемент с тегом, как у find
+    wanted = set(elements)
+    found = {}
+    for child in car:
+        if child.tag in wanted and child.tag not in found:
+            found[child.tag] = child.text
 
-    return " ".join(unique_id_parts)
+    return " ".join(found[name].strip() for name in elements if found.get(name) is not None)
 
 def convert_to_string(element):
     if element.text is not None:
@@ -161,7 +288,8 @@ def convert_to_string(element):
         convert_to_string(child)
 
 
-filename = 'cars.xml'
+# Локальный файл фида; раннер нескольких сайтов подставляет сюда общий скачанный фид
+filename = os.getenv('XML_FILE', 'cars.xml')
 # repo_name = os.environ('REPO_NAME')
 repo_name = os.getenv('REPO_NAME', 'localhost')
 
@@ -193,9 +321,22 @@ output_dir = "public/img/thumbs/"
 if not os.path.exists(output_dir):
     os.makedirs(output_dir)
 
+# THUMB_SPRITES=1 — превью машины еще и одной полосой: слайдер в карточке грузит один файл вместо пяти.
+# Отдельные превью остаются как есть, поэтому без флага ничего не меняется
+THUMB_SPRITES = os.getenv('THUMB_SPRITES', '0') == '1'
+
+# Кадр полосы — как у слайдера карточки (aspect-[4/3], ширина превью)
+SPRITE_FRAME = (360, 270)
+
 # Глобальный список для хранения путей к текущим превьюшкам
 current_thumbs = []
 
+# Страницы, чьи полосы превью соберет write_thumbs_sprites: slug -> превью страницы
+sprite_pages = {}
+
+# Плейсхолдеры превью (LQIP и доминирующий цвет) по относительному пути
+thumbs_placeholders = {}
+
 # Перевод некоторых свойств, для читабельности
 translations = {
      # engineType
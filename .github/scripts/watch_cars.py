@@ -0,0 +1,201 @@
+# python3 .github/scripts/watch_cars.py --feed https://example.com/feed.xml@300
+#
+# Долгоживущий режим update_cars.py: фиды опрашиваются условными запросами,
+# каждый со своим интервалом, а при изменениях пересобираются только
+# затронутые страницы, их превью и выгрузки.
+import os
+import re
+import sys
+import time
+import hashlib
+import argparse
+import xml.etree.ElementTree as ET
+from http_cache import fetch_cached
+from canonical import CANONICAL_OUTPUT, sort_cars
+from file_writer import file_writer
+from feed_schema import FeedValidator
+
+
+def parse_feed_arg(value, default_interval):
+    """Parses 'URL' or 'URL@SECONDS' into (url, interval)."""
+    url, _, interval = value.rpartition('@') if re.search(r'@\d+$', value) else (value, '', '')
+    return url, int(interval) if interval else default_interval
+
+
+def load_root(bodies):
+    """Merges the cars of all feeds into one <data><cars> tree, in feed order."""
+    root = ET.Element('data')
+    cars_element = ET.SubElement(root, 'cars')
+    for body_path in bodies:
+        feed_root = ET.parse(body_path).getroot()
+        feed_cars = feed_root.find('cars')
+        cars_element.extend(list(feed_cars if feed_cars is not None else []))
+    if CANONICAL_OUTPUT:
+        sort_cars(cars_element)
+    return root, cars_element
+
+
+def fingerprint(units):
+    digest = hashlib.sha1()
+    for car in units:
+        # Пробелы между машинами в фиде не должны влиять на отпечаток
+        tail, car.tail = car.tail, None
+        digest.update(ET.tostring(car, encoding='utf-8'))
+        car.tail = tail
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class CarsWatcher:
+    """
+    Keeps the normalized inventory, thumbnail registry and page hashes in
+    memory between polls and applies per-page deltas.
+    """
+
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self.bodies = {}
+        self.next_poll = {url: 0 for url, _ in feeds}
+        self.page_units = {}
+        self.page_hashes = {}
+
+    def poll(self):
+        """Polls the feeds that are due. Returns True if any of them changed."""
+        changed = False
+        now = time.time()
+        for url, interval in self.feeds:
+            if now < self.next_poll[url]:
+                continue
+            self.next_poll[url] = now + interval
+            try:
+                body_path, feed_changed = fetch_cached(url)
+            except Exception as e:
+                print(f"Ошибка при опросе фида {url}: {e}")
+                continue
+            if feed_changed or url not in self.bodies:
+                print(f"Фид изменился: {url}")
+                changed = True
+            self.bodies[url] = body_path
+        return changed
+
+    def remove_page(self, unique_id):
+        file_path = os.path.join(update_cars.directory, f"{unique_id}.mdx")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        update_cars.existing_files.discard(file_path)
+
+        thumb_pattern = re.compile(rf"^(thumb_{re.escape(unique_id)}_\d+|sprite_{re.escape(unique_id)})\.webp$")
+        for thumb in os.listdir(utils.output_dir):
+            if thumb_pattern.match(thumb):
+                thumb_path = os.path.join(utils.output_dir, thumb)
+                os.remove(thumb_path)
+                utils.thumbs_placeholders.pop(os.path.join("/img/thumbs/", thumb), None)
+                print(f"Удалено неиспользуемое превью: {thumb_path}")
+
+    def apply(self):
+        """Re-renders only the pages whose units changed since the previous poll."""
+        root, cars_element = load_root([self.bodies[url] for url, _ in self.feeds if url in self.bodies])
+        # Битые машины убираются до пересборки; сломанный целиком фид пропускаем, страницы остаются прежними
+        feed_validator = FeedValidator('cars')
+        if feed_validator.validate(cars_element, fatal=False) is None:
+            return
+        # Реестр превью нужен только пакетной очистке, в режиме наблюдения он бы только рос
+        utils.current_thumbs.clear()
+        update_cars.color_resolver.missing.clear()
+        update_cars.slug_index.sources.clear()
+
+        inventory = update_cars.InventoryTable()
+        pages = {}
+        for car in cars_element:
+            unique_id = update_cars.normalize_car(car)
+            inventory.add_car(car, unique_id)
+            update_cars.color_resolver.note_car(car)
+            pages.setdefault(unique_id, []).append(car)
+
+        fingerprints = {unique_id: fingerprint(units) for unique_id, units in pages.items()}
+        changed = [unique_id for unique_id, value in fingerprints.items() if self.page_units.get(unique_id) != value]
+        removed = [unique_id for unique_id in self.page_units if unique_id not in pages]
+
+        for unique_id in removed:
+            self.remove_page(unique_id)
+            self.page_units.pop(unique_id)
+            self.page_hashes.pop(unique_id, None)
+
+        for unique_id in changed:
+            file_path = os.path.join(update_cars.directory, f"{unique_id}.mdx")
+            # Страница собирается заново из всех своих машин, как в пакетном запуске
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            for car in pages[unique_id]:
+                update_cars.render_car(car, unique_id)
+        utils.write_thumbs_sprites(update_cars.directory)
+        file_writer.flush()
+
+        rewritten = 0
+        for unique_id in changed:
+            file_path = os.path.join(update_cars.directory, f"{unique_id}.mdx")
+            page_hash = file_hash(file_path)
+            if self.page_hashes.get(unique_id) != page_hash:
+                rewritten += 1
+            self.page_hashes[unique_id] = page_hash
+            self.page_units[unique_id] = fingerprints[unique_id]
+
+        if changed or removed:
+            update_cars.write_outputs(root, cars_element, inventory)
+            update_cars.save_probe_cache()
+            update_cars.save_hash_cache()
+            update_cars.save_blocks_cache()
+            update_cars.color_resolver.report()
+            update_cars.slug_index.report()
+            feed_validator.report()
+
+        print(f"Страниц изменено: {rewritten}, пересобрано: {len(changed)}, удалено: {len(removed)}")
+
+    def start(self):
+        """Cold start: drops pages that are not in the feeds and renders the rest."""
+        os.makedirs(update_cars.directory, exist_ok=True)
+        self.poll()
+        for existing_file in os.listdir(update_cars.directory):
+            self.page_units[existing_file[:-len('.mdx')]] = None
+        self.apply()
+
+    def run(self, tick):
+        self.start()
+        while True:
+            time.sleep(tick)
+            if self.poll():
+                self.apply()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Watch car feeds and apply incremental updates.')
+    parser.add_argument('--feed', action='append', default=[], help='Feed URL, optionally with a poll interval: URL@SECONDS')
+    parser.add_argument('--interval', type=int, default=300, help='Default poll interval in seconds')
+    parser.add_argument('--tick', type=int, default=5, help='How often to check whether a feed is due, in seconds')
+    args = parser.parse_args()
+
+    feed_args = args.feed or [url for url in os.getenv('XML_URL', '').split() if url]
+    if not feed_args:
+        print("Не указан ни один фид: --feed URL или XML_URL")
+        sys.exit(1)
+    feeds = [parse_feed_arg(value, args.interval) for value in feed_args]
+
+    # utils.py читает фид при импорте — подставляем ему уже скачанный файл
+    os.environ['XML_FILE'], _ = fetch_cached(feeds[0][0])
+
+    global update_cars, utils
+    import update_cars
+    import utils
+
+    with open('output.txt', 'w') as file:
+        file.write("")
+
+    CarsWatcher(feeds).run(args.tick)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,7 +20,16 @@ const lightbox = GLightbox({
 const imageObserver = new IntersectionObserver((entries, observer) => {
 	entries.forEach((entry) => {
 		if (entry.isIntersecting) {
-			entry.target.src = entry.target.dataset.src;
+			// Уменьшенные копии для <picture>, если они есть
+			entry.target.closest('picture')?.querySelectorAll('source[data-srcset]').forEach((source) => {
+				source.srcset = source.dataset.srcset;
+			});
+			if (entry.target.dataset.bg) {
+				// Кадр полосы превью: один файл на все слайды карточки, LQIP остается слоем под ним
+				entry.target.style.backgroundImage = entry.target.style.backgroundImage.replace('none', `url(${entry.target.dataset.bg})`);
+			} else {
+				entry.target.src = entry.target.dataset.src;
+			}
 			observer.unobserve(entry.target);
 		}
 	});
@@ -36,6 +45,8 @@ if(lazys.length){
 	lazys.forEach(lazy => {
 		if(lazy.querySelector('img')){
 			imageObserver.observe(lazy.querySelector('img'))
+		} else if(lazy.querySelector('[data-bg]')){
+			imageObserver.observe(lazy.querySelector('[data-bg]'))
 		}
 		lazy.classList.remove('lazy')
 	})
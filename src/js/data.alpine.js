@@ -119,6 +119,9 @@ document.addEventListener('alpine:init', () => {
 		carItems: document.querySelectorAll(".car-item"),
 		carListWrapper: document.querySelector(".car-list"), //wrapper
 		cars: [],
+		// Готовый индекс от генератора: перестановки по каждой сортировке и id машин по моделям
+		index: null,
+		carsById: [],
 		options: [
 			// { id: "default", title: "По умолчанию" },
 			{ id: "price_up", title: "По возрастанию цены" },
@@ -142,7 +145,9 @@ document.addEventListener('alpine:init', () => {
 			this.current = id;
 			this.setTitle();
 			this.open = false;
-			if(id != 'default'){
+			if(this.index && this.index.orders[id]){
+				this.cars = this.index.orders[id].map(i => this.carsById[i]);
+			}else if(id != 'default'){
 				this.cars.sort(function (a, b) {
 					var priceA = parseFloat(a.getAttribute("data-price"));
 					var priceB = parseFloat(b.getAttribute("data-price"));
@@ -161,12 +166,11 @@ document.addEventListener('alpine:init', () => {
 			}else{
 				this.cars = Array.from(this.carItems);
 			}
-			while (this.carListWrapper.firstChild) {
-				this.carListWrapper.removeChild(this.carListWrapper.firstChild);
-			}
+			const fragment = document.createDocumentFragment();
 			this.cars.forEach(function (element) {
-				document.querySelector(".car-list").appendChild(element);
+				fragment.appendChild(element);
 			});
+			this.carListWrapper.replaceChildren(fragment);
 			if(!this.firstLoadPage){
 				this.addQueryParam('sort_by', id);
 			}
@@ -180,6 +184,16 @@ document.addEventListener('alpine:init', () => {
 			this.total = 0;
 			const vm = this;
 			this.currentModel = model;
+			if(this.index){
+				const visible = model && model != 'all' ? (this.index.models[model] || []) : null;
+				this.carsById.forEach(element => element.style.display = visible ? 'none' : 'flex');
+				if(visible){
+					visible.forEach(i => this.carsById[i].style.display = 'flex');
+				}
+				this.total = visible ? (this.index.model_totals[model] || 0) : this.index.totals.reduce((acc, val) => acc + val, 0);
+				this.addQueryParam('model', model);
+				return;
+			}
 			this.cars.forEach(function (element) {
 				element.style.display = 'none';
 				if(model){
@@ -194,9 +208,22 @@ document.addEventListener('alpine:init', () => {
 			});
 			this.addQueryParam('model', model);
 		},
+		loadIndex() {
+			const indexElement = document.getElementById('cars-index');
+			if(!indexElement) return;
+			const index = JSON.parse(indexElement.textContent);
+			const bySlug = {};
+			this.cars.forEach(element => bySlug[element.dataset.slug] = element);
+			const carsById = index.slugs.map(slug => bySlug[slug]);
+			// Индекс устарел относительно страницы — сортируем по-старому, по атрибутам
+			if(carsById.length !== this.cars.length || carsById.some(element => !element)) return;
+			this.index = index;
+			this.carsById = carsById;
+		},
 		init() {
 			const vm = this;
 			this.cars = Array.from(this.carItems);
+			this.loadIndex();
 			this.setTitle();
 			const params = new URLSearchParams(document.location.search);
 			const modelParams = params.get('model');
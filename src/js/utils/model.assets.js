@@ -0,0 +1,19 @@
+// Манифест уменьшенных копий картинок моделей (.github/scripts/optimize_assets.py)
+const manifest = Object.values(import.meta.glob('/src/data/model-assets.json', { eager: true, import: 'default' }))[0] || {};
+
+const types = {
+	avif: 'image/avif',
+	webp: 'image/webp',
+};
+
+// <source> для <picture>: сначала AVIF, потом WEBP; пусто, если копий нет
+export function modelImageSources(src) {
+	const asset = manifest[src];
+	if (!asset) return [];
+	return Object.keys(types)
+		.filter((format) => asset.sources[format])
+		.map((format) => ({
+			type: types[format],
+			srcset: asset.sources[format].map(([url, width]) => `${url} ${width}w`).join(', '),
+		}));
+}